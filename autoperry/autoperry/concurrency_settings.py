@@ -0,0 +1,18 @@
+from autoperry.settings import *
+
+# For tests that use several database connections at once, such as
+# webapp.tests.test_volunteering. The usual in-memory SQLite test
+# database makes concurrent writers fail at once instead of waiting,
+# so use a file, and wait for another connection's write lock
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test-db.sqlite3',
+        },
+    }
+}
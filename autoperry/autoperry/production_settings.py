@@ -22,6 +22,32 @@ DATABASES = {
     }
 }
 
+# The default cache is in the database, shared with the management
+# commands so that invalidation in one process is seen by the others
+# (a file based cache lists its whole directory on every write, which
+# made a cold index page take seconds). Template fragments are keyed
+# on event versions, so never go stale and can be kept in each process.
+# The cache table is created by 'manage.py createcachetable'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'webapp_cache',
+        'KEY_PREFIX': 'autoperry',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+        'KEY_PREFIX': 'autoperry',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
 host: 'smtp-auth.mythic-beasts.com'
@@ -30,6 +56,12 @@ username: 'autoperry@cambridgeringing.info'
 password: EMAIL_PASSWORD
 use_tls: True
 
+# Notification emails are sent by run_outbox.sh
+
+WEBAPP_EMAIL_OUTBOX = True
+
+WEBAPP_TIMING_LOG = True
+
 # Default scheme and domain for URL's in emails
 
 WEBAPP_SCHEME = 'https'
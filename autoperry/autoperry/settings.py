@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'webapp.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,7 +67,8 @@ ROOT_URLCONF = 'autoperry.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The standard backend, timed for webapp.middleware.TimingMiddleware
+        'BACKEND': 'webapp.middleware.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,6 +96,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Local memory is private to each process. To share a cache between
+# Gunicorn workers use the file-based backend:
+#
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR.parent / 'cache',
+#
+# or a Redis-compatible server (needs the 'redis' package):
+#
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#     'LOCATION': 'redis://127.0.0.1:6379',
+#
+# Pages cache a fragment for each event listed, plus its version, so
+# allow for many more entries than the default of 300
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'autoperry',
+        'KEY_PREFIX': 'autoperry',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -154,6 +185,24 @@ EMAIL_SUBJECT_PREFIX = '[AutoPerry] '
 #EMAIL_HOST = "localhost"
 #EMAIL_PORT = 1025
 
+# If True, event notification emails are stored in webapp.OutboxMessage
+# and sent by the process_outbox management command rather than during
+# the request
+
+WEBAPP_EMAIL_OUTBOX = False
+
+# If True, the events and account lists page by seeking past the last
+# row shown (with First/Previous/Next links) rather than by page number,
+# so that deep pages are as quick as the first
+
+WEBAPP_KEYSET_PAGINATION = False
+
+# If True, webapp.middleware.TimingMiddleware logs one line per request
+# to the 'webapp.timing' logger. Off here so that running the tests
+# doesn't fill the log file
+
+WEBAPP_TIMING_LOG = False
+
 MESSAGE_TAGS = {
         messages.DEBUG: 'alert-secondary',
         messages.INFO: 'alert-info',
@@ -208,6 +257,13 @@ LOGGING = {
             'handlers': ['autoperry', 'autoperry-file'],
             'level': 'INFO',
         },
+        # One line per request (see WEBAPP_TIMING_LOG), so only in the
+        # production log file
+        'webapp.timing': {
+            'handlers': ['autoperry-file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     }
 }
 
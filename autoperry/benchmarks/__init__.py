@@ -0,0 +1,76 @@
+"""
+Benchmarks for AutoPerry, run against a throwaway database created in
+the same way as the one used by the tests. Run them from the directory
+containing manage.py, for example
+
+    python -m benchmarks.csv_export
+
+Benchmarks that need a realistic amount of data use the generate_data
+management command to create it.
+"""
+
+from contextlib import contextmanager
+
+import os
+
+
+def setup():
+
+    """
+    Configure Django for a standalone benchmark script
+    """
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'autoperry.settings')
+
+    import django
+    django.setup()
+
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+
+@contextmanager
+def benchmark_database():
+
+    """
+    Create a test database for the duration of the block
+    """
+
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def admin_client(admin=None):
+
+    """
+    Return a test Client logged in as admin, made an administrator, or
+    as a new administrator
+    """
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group, Permission
+    from django.test import Client
+    from django.utils import timezone
+
+    if admin is None:
+        admin = get_user_model().objects.create_user(
+            email='benchmark-admin@autoperry.com',
+            password=None,
+            first_name='Fiona',
+            last_name='Administrator',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+    group, _ = Group.objects.get_or_create(name='webapp.administrators')
+    group.permissions.add(Permission.objects.get(codename='administrator'))
+    admin.groups.add(group)
+
+    client = Client()
+    client.force_login(admin)
+    return client
@@ -0,0 +1,118 @@
+"""
+Time the 56 day index page and an event's details with a cold cache
+against different cache configurations, against synthetic data from
+the generate_data management command
+
+    python -m benchmarks.cache_backends [--users 2000] [--events 20000] [--entries 10000] [--iterations 10]
+
+'file' is a FileBasedCache holding --entries other entries, as a busy
+site's would, 'database' is a DatabaseCache holding the same, and
+'database+local' is that with template fragments kept in a per-process
+LocMemCache as in production_settings. Before each fetch the entries
+for the page are cleared, so that it has to rebuild and store every
+fragment and event version. Times are medians in milliseconds.
+"""
+
+from benchmarks import setup, benchmark_database, admin_client
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+
+def configurations(directory):
+
+    """
+    Return (name, CACHES) for each configuration to be timed
+    """
+
+    file = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': directory,
+        'KEY_PREFIX': 'autoperry',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+    database = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'webapp_cache',
+        'KEY_PREFIX': 'autoperry',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+    local = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+        'KEY_PREFIX': 'autoperry',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+    return [('file', {'default': file}),
+            ('database', {'default': database}),
+            ('database+local', {'default': database, 'template_fragments': local})]
+
+
+def cold_timings(client, url, iterations, entries):
+
+    """
+    Fetch url iterations times, each after clearing the caches and
+    refilling the default one with entries unrelated entries, returning
+    the median time in milliseconds
+    """
+
+    from django.core.cache import caches
+
+    times = []
+    for i in range(iterations):
+        for cache in caches.all():
+            cache.clear()
+        caches['default'].set_many({f'filler.{n}': 'x' * 200 for n in range(entries)}, 3600)
+        begin = time.perf_counter()
+        client.get(url)
+        times.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(times)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from webapp.models import Event
+
+    from io import StringIO
+
+    directory = tempfile.mkdtemp()
+
+    with benchmark_database():
+
+        call_command('createcachetable', 'webapp_cache', stdout=StringIO())
+        call_command('generate_data', '--really', users=args.users, events=args.events,
+            years=args.years, stdout=StringIO())
+
+        event = (Event.objects
+            .filter(cancelled=None)
+            .order_by('-current_helper_count', 'start')
+            .first())
+        client = admin_client(event.owner)
+
+        try:
+            for name, caches in configurations(directory):
+                with override_settings(CACHES=caches):
+                    print(f'{name}:')
+                    for label, url in (('index 56 days', '/?days=56'), ('event_details', f'/event/{event.pk}/')):
+                        print(f'    {label:15} cold {cold_timings(client, url, args.iterations, args.entries):8.1f} ms')
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Time event_clash_error and volunteer_clash_error against a synthetic
+multi-year calendar as it grows, reporting median and 95th percentile
+latency at each size
+
+    python -m benchmarks.clash_check [--sizes 1000 10000 100000] [--checks 200]
+"""
+
+from benchmarks import setup, benchmark_database
+
+import argparse
+import random
+import statistics
+import time
+
+LOCATIONS = 50
+
+
+def populate(n_events, helper, owner):
+
+    """
+    Add events up to a total of n_events, three a day spread over the
+    towers, with helper volunteering for every tenth one
+    """
+
+    from webapp.models import Event, Volunteer
+
+    from datetime import datetime, timedelta
+
+    base = datetime(2015, 1, 1, 19, 30)
+    first = Event.objects.count()
+    events = []
+    for i in range(first, n_events):
+        start = base + timedelta(hours=8*i)
+        events.append(Event(
+            start=start,
+            end=start + timedelta(hours=1, minutes=30),
+            location=f'Tower {i % LOCATIONS}',
+            helpers_required=2,
+            owner=owner,
+            notes='Benchmark event'))
+    Event.objects.bulk_create(events, batch_size=5000)
+
+    Volunteer.objects.bulk_create(
+        [Volunteer(event=event, person=helper) for event in Event.objects.filter(pk__gt=first).only('pk')[::10]],
+        batch_size=5000)
+
+
+def timed(function, n):
+
+    """
+    Call function n times, returning latencies in milliseconds
+    """
+
+    times = []
+    for i in range(n):
+        begin = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - begin) * 1000)
+    return times
+
+
+def report(name, times):
+
+    p95 = statistics.quantiles(times, n=20)[-1]
+    print(f'    {name}: median {statistics.median(times):.2f} ms, p95 {p95:.2f} ms')
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--checks', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from webapp.models import Event
+    from webapp.util import event_clash_error, volunteer_clash_error
+
+    from datetime import timedelta
+
+    with benchmark_database():
+
+        now = timezone.now()
+        user_model = get_user_model()
+        owner = user_model.objects.create_user(
+            email='owner@autoperry.com', password=None, first_name='Geoff', last_name='Owner',
+            tower='Little Shelford', email_validated=now, approved=now)
+        helper = user_model.objects.create_user(
+            email='helper@autoperry.com', password=None, first_name='Denise', last_name='Helper',
+            tower='Little Shelford', email_validated=now, approved=now)
+
+        random.seed(1960)
+
+        for size in sorted(args.sizes):
+
+            populate(size, helper, owner)
+            events = list(Event.objects.order_by('?')[:args.checks])
+
+            def event_check():
+                event = random.choice(events)
+                start = event.start + timedelta(minutes=random.choice([-90, 30, 600]))
+                event_clash_error(start, start + timedelta(hours=1), event.location)
+
+            def volunteer_check():
+                volunteer_clash_error(helper, random.choice(events))
+
+            print(f'{size} events:')
+            report('event_clash_error', timed(event_check, args.checks))
+            report('volunteer_clash_error', timed(volunteer_check, args.checks))
+
+        clashes = (Event.objects.filter(cancelled=None, location='Tower 1')
+            .filter(start__lt=now, end__gt=now))
+        print(f'Query plan for event clashes:\n{clashes.explain()}')
+
+
+if __name__ == '__main__':
+    main()
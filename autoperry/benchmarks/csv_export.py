@@ -0,0 +1,122 @@
+"""
+Export a large number of synthetic events (and their owners) as CSV and
+report time-to-first-byte, total time and peak memory use
+
+    python -m benchmarks.csv_export [--events 100000] [--users 1000]
+"""
+
+from benchmarks import setup, benchmark_database, admin_client
+
+import argparse
+import random
+import resource
+import time
+import tracemalloc
+
+
+def populate(n_events, n_users):
+
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from webapp.models import Event
+
+    from datetime import datetime, timedelta
+
+    user_model = get_user_model()
+    now = timezone.now()
+    user_model.objects.bulk_create(
+        [user_model(email=f'user{i}@autoperry.com',
+                    first_name='Bench',
+                    last_name=f'User {i}',
+                    tower='Little Shelford',
+                    email_validated=now,
+                    approved=now) for i in range(n_users)],
+        batch_size=1000)
+    owners = list(user_model.objects.values_list('pk', flat=True))
+
+    random.seed(1960)
+    base = datetime(2020, 1, 1, 19, 30)
+    events = []
+    for i in range(n_events):
+        start = base + timedelta(hours=6*i)
+        helpers_required = random.randint(1, 6)
+        events.append(Event(
+            start=start,
+            end=start + timedelta(hours=1, minutes=30),
+            location=f'Tower {random.randint(1, 200)}',
+            helpers_required=helpers_required,
+            current_helper_count=random.randint(0, helpers_required),
+            owner_id=random.choice(owners),
+            notes='Benchmark event'))
+        if len(events) == 5000:
+            Event.objects.bulk_create(events)
+            events = []
+    Event.objects.bulk_create(events)
+
+
+def consume(client, url):
+
+    """
+    Fetch url, returning (time to first byte, total time, rows, bytes)
+    """
+
+    begin = time.perf_counter()
+    response = client.get(url)
+    content = iter(response.streaming_content)
+    size = len(next(content))
+    first_byte = time.perf_counter() - begin
+    rows = 0
+    for chunk in content:
+        size += len(chunk)
+        rows += 1
+    return first_byte, time.perf_counter() - begin, rows, size
+
+
+def export(client, url):
+
+    # Warm up, so the first request's one-off costs aren't counted
+    client.get(url).close()
+
+    first_byte, total, rows, size = consume(client, url)
+
+    # Measure memory separately as tracing slows everything down
+    tracemalloc.start()
+    consume(client, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return { 'rows': rows,
+             'bytes': size,
+             'time_to_first_byte': first_byte,
+             'total_time': total,
+             'peak_traced_memory': peak }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+
+    with benchmark_database():
+
+        populate(args.events, args.users)
+        client = admin_client()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        for url in ('/events-csv/', '/admin/account-list-csv/'):
+            result = export(client, url)
+            print(f'{url}: {result["rows"]} rows, {result["bytes"]} bytes, '
+                  f'first byte {result["time_to_first_byte"]*1000:.1f} ms, '
+                  f'total {result["total_time"]:.2f} s, '
+                  f'peak traced memory {result["peak_traced_memory"]/1024/1024:.1f} MiB')
+
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f'Peak RSS {rss_before/1024:.1f} MiB after loading data, {rss_after/1024:.1f} MiB after exports')
+
+
+if __name__ == '__main__':
+    main()
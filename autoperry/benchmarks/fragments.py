@@ -0,0 +1,95 @@
+"""
+Compare rendering the 56 day index page and an event's details with
+and without the cached template fragments for each event, against
+synthetic data from the generate_data management command
+
+    python -m benchmarks.fragments [--users 2000] [--events 20000] [--iterations 20]
+
+'uncached' renders every fragment (the template_fragments cache is
+replaced by a dummy one), 'cached' is with the fragments already in
+the cache. Times are medians of the template rendering time from the
+Server-Timing header and of the whole request.
+"""
+
+from benchmarks import setup, benchmark_database, admin_client
+
+import argparse
+import re
+import statistics
+
+DUMMY_FRAGMENTS = {
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+def timings(client, url, iterations):
+
+    """
+    Fetch url iterations times, returning median template and total
+    times in milliseconds and the number of rows in the page
+    """
+
+    templates = []
+    totals = []
+    for i in range(iterations):
+        response = client.get(url)
+        header = response['Server-Timing']
+        templates.append(float(re.search(r'tpl;dur=([\d.]+)', header).group(1)))
+        totals.append(float(re.search(r'total;dur=([\d.]+)', header).group(1)))
+    rows = response.content.decode().count('<tr')
+    return statistics.median(templates), statistics.median(totals), rows
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from webapp.models import Event
+
+    from io import StringIO
+
+    with benchmark_database():
+
+        call_command('generate_data', '--really', users=args.users, events=args.events,
+            years=args.years, stdout=StringIO())
+
+        event = (Event.objects
+            .filter(cancelled=None)
+            .order_by('-current_helper_count', 'start')
+            .first())
+        # Server-Timing headers are only sent to staff
+        event.owner.is_staff = True
+        event.owner.save()
+        client = admin_client(event.owner)
+
+        for name, url in (('index 56 days', '/?days=56'), ('event_details', f'/event/{event.pk}/')):
+
+            cache.clear()
+            with override_settings(CACHES={**settings.CACHES, **DUMMY_FRAGMENTS}):
+                uncached = timings(client, url, args.iterations)
+
+            cache.clear()
+            client.get(url)
+            cached = timings(client, url, args.iterations)
+
+            print(f'{name} ({cached[2]} rows):' if cached[2] else f'{name}:')
+            for label, (template_ms, total_ms, rows) in (('uncached', uncached), ('cached', cached)):
+                print(f'    {label:10} templates {template_ms:8.1f} ms  total {total_ms:8.1f} ms')
+            print(f'    template time reduced by {100 * (1 - cached[0] / uncached[0]):.0f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Time the busiest views against synthetic data from the generate_data
+management command, recording query counts and latencies to a JSON
+file for comparison across commits
+
+    python -m benchmarks.views [--users 2000] [--events 20000] [--iterations 20] [--output views.json]
+
+Each view is fetched once with an empty cache (reported as 'cold'),
+then --iterations times more for the median and 95th percentile.
+Views are fetched as the user who has helped most, made an
+administrator so every view is available.
+"""
+
+from benchmarks import setup, benchmark_database, admin_client
+
+from itertools import product
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+
+def urls(user, event):
+
+    """
+    Return (name, url) for each view and variation to be timed
+    """
+
+    result = [('index', '/'),
+              ('index 56 days', '/?days=56')]
+
+    for flags in product((False, True), repeat=4):
+        selected = [flag for flag, on in zip(('past', 'cancelled', 'mine', 'location'), flags) if on]
+        query = ''.join(f'&{flag}=yes' for flag in selected)
+        result.append((f'events {"+".join(selected) or "default"}', f'/events/?f=1{query}'))
+
+    result += [('event_details', f'/event/{event.pk}/'),
+               ('account', '/account/'),
+               ('account_list', '/admin/account-list/'),
+               ('stats_screen', '/stats/'),
+               ('ical', f'/ical/{user.uuid}/'),
+               ('ical_future', f'/ical/future/{user.uuid}/'),
+               ('events_csv', '/events-csv/'),
+               ('account_list_csv', '/admin/account-list-csv/')]
+
+    return result
+
+
+def fetch(client, url):
+
+    """
+    Fetch url, consuming any streamed content, returning (status,
+    seconds taken, number of queries)
+    """
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as context:
+        begin = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            for chunk in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - begin
+    return response.status_code, elapsed, len(context.captured_queries)
+
+
+def measure(client, url, iterations):
+
+    from django.core.cache import cache
+
+    cache.clear()
+    status, cold, cold_queries = fetch(client, url)
+
+    times = []
+    queries = set()
+    for i in range(iterations):
+        status, elapsed, n = fetch(client, url)
+        times.append(elapsed * 1000)
+        queries.add(n)
+
+    return { 'url': url,
+             'status': status,
+             'cold_queries': cold_queries,
+             'queries': max(queries),
+             'cold_ms': round(cold * 1000, 2),
+             'p50_ms': round(statistics.median(times), 2),
+             'p95_ms': round(statistics.quantiles(times, n=20)[-1], 2) }
+
+
+def commit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--only', help='Only time views whose name contains this')
+    parser.add_argument('--output', default='views.json')
+    args = parser.parse_args()
+
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db.models import Count
+    from webapp.models import Event, Volunteer
+
+    from io import StringIO
+
+    with benchmark_database():
+
+        call_command('generate_data', '--really', users=args.users, events=args.events,
+            years=args.years, stdout=StringIO())
+
+        user = (get_user_model().objects
+            .filter(cancelled=None, suspended=None)
+            .annotate(n=Count('volunteer'))
+            .order_by('-n')
+            .first())
+        event = (Event.objects
+            .filter(cancelled=None)
+            .order_by('-current_helper_count', 'start')
+            .first())
+        client = admin_client(user)
+
+        results = {}
+        for name, url in urls(user, event):
+            if args.only and args.only not in name:
+                continue
+            results[name] = result = measure(client, url, args.iterations)
+            print(f'{name:40} {result["status"]} queries {result["queries"]:4} (cold {result["cold_queries"]:4})  '
+                  f'cold {result["cold_ms"]:8.1f} ms  p50 {result["p50_ms"]:8.1f} ms  p95 {result["p95_ms"]:8.1f} ms')
+
+        output = { 'commit': commit(),
+                   'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'data': { 'users': get_user_model().objects.count(),
+                             'events': Event.objects.count(),
+                             'volunteers': Volunteer.objects.count() },
+                   'iterations': args.iterations,
+                   'results': results }
+
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
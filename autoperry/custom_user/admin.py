@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count, Q
 from django_use_email_as_username.admin import BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 
@@ -24,6 +25,9 @@ class HelpedInLine(admin.TabularInline):
     show_change_link = True
     classes = ( "collapse", )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('event')
+
 class OwnedInLine(admin.TabularInline):
     fields = [
         "__str__"
@@ -178,6 +182,52 @@ class CustomBaseUserAdmin(BaseUserAdmin):
         "email",
     ]
 
+    def is_autocomplete(self, request):
+        return request.resolver_match is not None and request.resolver_match.url_name == 'autocomplete'
+
+    def get_queryset(self, request):
+
+        """
+        Annotate the counts of events helped and owned, rather than
+        counting them for each row. Autocomplete lookups don't show them
+        """
+
+        queryset = super().get_queryset(request)
+        if self.is_autocomplete(request):
+            return queryset
+        current = Q(volunteer__withdrawn=None, volunteer__declined=None)
+        return (queryset
+            .annotate(helped_count=Count('volunteer__event', filter=current, distinct=True),
+                      owned_count=Count('events_owned', distinct=True)))
+
+    def get_search_results(self, request, queryset, search_term):
+
+        """
+        For autocomplete lookups (from the event owner and helper
+        filters) match the start of the first or last name, or a first
+        name followed by the start of the last one, which can use the
+        indexes on them
+        """
+
+        if not self.is_autocomplete(request):
+            return super().get_search_results(request, queryset, search_term)
+        term = ' '.join(search_term.split())
+        if not term:
+            return queryset, False
+        names = Q(last_name__istartswith=term) | Q(first_name__istartswith=term)
+        first, _, last = term.partition(' ')
+        if last:
+            names |= Q(first_name__iexact=first, last_name__istartswith=last)
+        return queryset.filter(names), False
+
+    @admin.display(ordering='helped_count', description='events helped')
+    def n_events_helped(self, obj):
+        return obj.helped_count
+
+    @admin.display(ordering='owned_count', description='events owned')
+    def n_events_owned(self, obj):
+        return obj.owned_count
+
 
 
 admin.site.register(User, CustomBaseUserAdmin)
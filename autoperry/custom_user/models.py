@@ -130,6 +130,11 @@ class User(BaseUser):
         permissions = [
             ('administrator', 'Is system administrator')
         ]
+        indexes = [
+            # Name lookups in the admin's user autocomplete
+            models.Index(fields=['last_name', 'first_name'], name='user_name_index'),
+            models.Index(fields=['first_name'], name='user_first_name_index'),
+        ]
 
 
 
@@ -1,7 +1,12 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
 from django.utils import timezone
+from django.utils.text import smart_split, unescape_string_literal
 
-from webapp.models import Event, Volunteer
+from webapp.models import Event, OutboxMessage, Volunteer
 
 
 class CancelledListFilter(admin.SimpleListFilter):
@@ -56,6 +61,70 @@ class PastListFilter(admin.SimpleListFilter):
             return queryset.filter(**{f'{self.parameter_name}__gte': now})
 
 
+class UserAutocompleteFilter(admin.SimpleListFilter):
+
+    """
+    SimpleListFilter on a single user, chosen with the admin's
+    autocomplete widget (which looks users up by name as you type)
+    rather than from a list of every user. Subclasses set field_name
+    to the Event field whose autocomplete to use, and filter()
+    """
+
+    template = 'webapp/admin-user-filter-fragment.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.admin_site = model_admin.admin_site
+        self.source_field = model._meta.get_field(self.field_name)
+        super().__init__(request, params, model, model_admin)
+
+    def user_id(self):
+        value = self.value()
+        return int(value) if value and value.isdigit() else None
+
+    def lookups(self, request, model_admin):
+        # Just the chosen user, if there is one
+        if not self.user_id():
+            return []
+        return [(str(user.pk), str(user)) for user in get_user_model().objects.filter(pk=self.user_id())]
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.user_id():
+            return self.filter(queryset, self.user_id())
+
+    def select(self):
+
+        """
+        Render the autocomplete select, showing the chosen user
+        """
+
+        field = forms.ModelChoiceField(get_user_model().objects.all(), required=False,
+            widget=AutocompleteSelect(self.source_field, self.admin_site))
+        return field.widget.render(self.parameter_name, self.user_id(), attrs={'id': f'id_{self.parameter_name}_filter'})
+
+
+class OwnerListFilter(UserAutocompleteFilter):
+    title = 'owner'
+    parameter_name = 'owner'
+    field_name = 'owner'
+
+    def filter(self, queryset, user_id):
+        return queryset.filter(owner=user_id)
+
+
+class HelperListFilter(UserAutocompleteFilter):
+    title = 'helper'
+    parameter_name = 'helper'
+    field_name = 'helpers'
+
+    def filter(self, queryset, user_id):
+        # A subquery, since joining through helpers would repeat events
+        # someone volunteered for more than once
+        return queryset.filter(pk__in=Volunteer.objects.filter(person=user_id).values('event'))
+
 
 class HelpersInline(admin.TabularInline):
     model = Event.helpers.through
@@ -76,6 +145,9 @@ class HelpersInline(admin.TabularInline):
     show_change_link = True
     classes = ( "collapse", )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('person')
+
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     date_hierarchy = 'start'
@@ -95,17 +167,18 @@ class EventAdmin(admin.ModelAdmin):
     list_display = [
         'short_when',
         'location',
+        'owner',
         'past',
         'is_cancelled',
         'helpers_required',
         'n_helpers_available',
-        'helpers_needed']
+        'helpers_shortfall']
     list_filter = [
          PastListFilter,
          CancelledListFilter,
         'location',
-        'owner',
-        'helpers'
+         OwnerListFilter,
+         HelperListFilter,
     ]
     ordering = [
         '-start'
@@ -119,9 +192,72 @@ class EventAdmin(admin.ModelAdmin):
         'location',
         'owner__first_name',
         'owner__last_name',
-        'helpers__first_name',
-        'helpers__last_name'
     ]
     search_help_text = "Search on location, or owner or helper name"
     view_on_site = True
 
+    @property
+    def media(self):
+        widget = AutocompleteSelect(Event._meta.get_field('owner'), self.admin_site)
+        return super().media + widget.media + forms.Media(js=['admin/js/jquery.init.js', 'webapp/admin-user-filter.js'])
+
+    def get_search_results(self, request, queryset, search_term):
+
+        """
+        As for search_fields, but each word may also match the name of
+        a helper. Helpers are matched with a subquery, since joining
+        through helpers repeats events with several helpers and the
+        results would need DISTINCT
+        """
+
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            names = Q(person__first_name__icontains=bit) | Q(person__last_name__icontains=bit)
+            queryset = queryset.filter(
+                Q(location__icontains=bit) |
+                Q(owner__first_name__icontains=bit) |
+                Q(owner__last_name__icontains=bit) |
+                Q(pk__in=Volunteer.objects.filter(names).values('event')))
+        return queryset, False
+
+    def get_queryset(self, request):
+
+        """
+        Annotate the shortfall in helpers so that the changelist can
+        be sorted on it
+        """
+
+        return (super().get_queryset(request)
+            .select_related('owner')
+            .annotate(shortfall=F('helpers_required') - F('current_helper_count')))
+
+    @admin.display(boolean=True, ordering='shortfall', description='helpers needed')
+    def helpers_shortfall(self, obj):
+        return obj.helpers_needed
+
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    date_hierarchy = 'created'
+    list_display = [
+        'created',
+        'subject',
+        'sent',
+        'attempts',
+        'next_attempt']
+    ordering = [
+        '-created'
+    ]
+    readonly_fields = [
+        'created',
+        'recipients',
+        'subject',
+        'body',
+        'sent',
+        'last_error'
+    ]
+    search_fields = [
+        'subject'
+    ]
@@ -0,0 +1,201 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import time
+
+GENERATION_KEY = 'webapp.generation.{}'
+
+# Generation counters bumped by signals whenever an instance of the
+# model is saved or deleted (see webapp.signals)
+EVENT = 'event'
+VOLUNTEER = 'volunteer'
+USER = 'user'
+MODEL_GENERATIONS = (EVENT, VOLUNTEER, USER)
+
+# Returned by cache.get() for a missing key, so that None can be cached
+MISSING = object()
+
+# Set within on_commit_only()
+deferring = ContextVar('deferring', default=False)
+
+
+@contextmanager
+def on_commit_only():
+
+    """
+    Within this, invalidation only happens once the current transaction
+    commits, rather than straight away as well, so that nothing writes
+    to the cache (which may be in the database) while the transaction
+    is holding row locks
+    """
+
+    token = deferring.set(True)
+    try:
+        yield
+    finally:
+        deferring.reset(token)
+
+
+def now_and_on_commit(invalidate):
+
+    """
+    Call invalidate() now, unless within on_commit_only(), and again
+    once the current transaction commits in case something has been
+    cached from uncommitted data in the meantime
+    """
+
+    if not deferring.get():
+        invalidate()
+    transaction.on_commit(invalidate)
+
+
+def generation(name):
+
+    """
+    Return the current value of the named generation counter, for use
+    in cache keys. Counters start from the current time so that one
+    that has been evicted can't restart at a value already used in keys
+    """
+
+    key = GENERATION_KEY.format(name)
+    value = cache.get(key)
+    if value is None:
+        value = time.time_ns()
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+    return value
+
+
+def generations(names):
+
+    """
+    Return the current values of several generation counters
+    """
+
+    return [generation(name) for name in names]
+
+
+def bump_generation(name):
+
+    """
+    Advance the named generation counter, making any cache entries
+    keyed on the old value unreachable. Done again once the current
+    transaction commits in case an entry was rebuilt from uncommitted
+    data (see now_and_on_commit). The counter is set to the current time rather than using
+    cache.incr(), which isn't atomic on every backend, so that every
+    bump gives a value not seen before
+    """
+
+    now_and_on_commit(lambda: cache.set(GENERATION_KEY.format(name), time.time_ns(), None))
+
+
+def versioned_key(name, *parts, depends=MODEL_GENERATIONS):
+
+    """
+    Return a cache key for name and parts that includes the current
+    value of each generation counter in depends, so that it changes
+    whenever any of them is bumped
+    """
+
+    return '.'.join(['webapp', name, *[str(part) for part in parts], *[str(g) for g in generations(depends)]])
+
+
+def cached(key, build, timeout):
+
+    """
+    Return the value cached under key, calling build() to compute and
+    cache it if there isn't one
+    """
+
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+# Values held in this process's memory by local_cached, as
+# name: (generation, time built, value)
+_local = {}
+
+
+def local_cached(name, build, timeout):
+
+    """
+    Return the value of build() held in this process's memory, building
+    it again once the generation counter called name has been bumped or
+    after timeout seconds. Checking it costs a single cache lookup
+    however large the value is. The timeout only matters for a value
+    built from data in a transaction that was then rolled back, which
+    leaves the counter alone
+    """
+
+    current = generation(name)
+    entry = _local.get(name)
+    if entry is None or entry[0] != current or time.monotonic() - entry[1] > timeout:
+        entry = (current, time.monotonic(), build())
+        _local[name] = entry
+    return entry[2]
+
+
+# Per-event version counters for keying template fragments, bumped
+# whenever the event or any of its volunteers changes. Versions also
+# include the EVENT_VERSIONS generation (bumped when we can't tell
+# which events changed) and the user generation, since owner and
+# helper names and contact details appear in the fragments
+EVENT_VERSION_KEY = 'webapp.event_version.{}'
+EVENT_VERSIONS = 'event_versions'
+
+# As long as the fragments keyed on them are cached for (see the
+# {% cache %} tags), so that versions of events no longer being viewed
+# expire rather than accumulating. A new version just means the
+# fragments are rendered again
+EVENT_VERSION_TIMEOUT = 3600
+
+
+def event_versions(event_ids):
+
+    """
+    Return a dictionary of the current version of each event, starting
+    a new version for any that don't have one, in a single cache round
+    trip plus one to record the new ones
+    """
+
+    keys = {EVENT_VERSION_KEY.format(pk): pk for pk in event_ids}
+    versions = cache.get_many(keys)
+    new = {key: time.time_ns() for key in keys if key not in versions}
+    if new:
+        cache.set_many(new, EVENT_VERSION_TIMEOUT)
+        versions.update(new)
+    common = '.'.join(str(g) for g in generations((EVENT_VERSIONS, USER)))
+    return {pk: f'{versions[key]}.{common}' for key, pk in keys.items()}
+
+
+def load_event_versions(events):
+
+    """
+    Fetch the versions of all of events at once, so that their
+    Event.version doesn't each need a trip to the cache. Returns a
+    list of the events
+    """
+
+    events = list(events)
+    versions = event_versions([event.pk for event in events])
+    for event in events:
+        event._version = versions[event.pk]
+    return events
+
+
+def bump_event_versions(*event_ids):
+
+    """
+    Start new versions of the given events, now and again once the
+    current transaction commits (see now_and_on_commit)
+    """
+
+    keys = [EVENT_VERSION_KEY.format(pk) for pk in event_ids]
+    if keys:
+        now_and_on_commit(lambda: cache.delete_many(keys))
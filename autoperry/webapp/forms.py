@@ -79,6 +79,18 @@ class EventForm(forms.Form):
         }
         js = ('webapp/jquery.min.js', 'webapp/jquery-ui.min.js')
 
+class EventCreateForm(EventForm):
+    weeks = forms.IntegerField(min_value=1, max_value=52, initial=1, required=False, label='Repeat for', help_text='Number of weeks to create this event for (1 for just this date)')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper.layout.insert(1,
+            Row(
+                Column('weeks', css_class='form-group col-md-4 mb-0'),
+                css_class='form-row'
+            )
+        )
+
 class UserEditForm(forms.Form):
     email = forms.EmailField(help_text="You will need to re-confirm your email address if you change this")
     first_name = forms.CharField(max_length=150)
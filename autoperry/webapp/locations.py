@@ -0,0 +1,109 @@
+from django.db.models import Count
+
+from .caching import bump_generation, local_cached
+from .models import Event
+
+from bisect import bisect_left
+
+# Generation counter bumped whenever the locations change
+LOCATIONS = 'locations'
+
+LOCATIONS_TIMEOUT = 3600
+
+# Number of suggestions returned by location_matches
+LOCATION_MATCHES = 10
+
+
+def build_locations():
+
+    """
+    Return a list of (location, number of events) for the locations
+    of all non-cancelled events, in location order, from a single
+    GROUP BY over Event
+    """
+
+    return list(Event.objects.all()
+        .filter(cancelled=None)
+        .order_by('location')
+        .values('location')
+        .annotate(n=Count('id'))
+        .values_list('location', 'n'))
+
+
+def build_location_index(locations):
+
+    """
+    Return an index over locations for prefix searches: a list of
+    lower-cased names in sorted order, and a matching list of
+    (location, number of events)
+    """
+
+    entries = sorted((location.lower(), location, n) for location, n in locations)
+    return { 'keys': [key for key, location, n in entries],
+             'entries': [(location, n) for key, location, n in entries] }
+
+
+def location_registry():
+
+    """
+    Return the locations and their prefix index, held in this
+    process's memory so that each lookup doesn't fetch them from the
+    cache
+    """
+
+    def build():
+        locations = build_locations()
+        return { 'locations': locations, 'index': build_location_index(locations) }
+
+    return local_cached(LOCATIONS, build, LOCATIONS_TIMEOUT)
+
+
+def locations():
+
+    """
+    Return the (cached) list of locations and their usage counts
+    """
+
+    return location_registry()['locations']
+
+
+def popular_locations():
+
+    """
+    Return location names, most used first and then alphabetically,
+    for suggesting as the location of a new event
+    """
+
+    return [location for location, n in sorted(locations(), key=lambda item: -item[1])]
+
+
+def location_matches(prefix, limit=LOCATION_MATCHES):
+
+    """
+    Return up to limit location names starting with prefix (ignoring
+    case), most used first. An empty prefix matches everything
+    """
+
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return popular_locations()[:limit]
+
+    index = location_registry()['index']
+    keys = index['keys']
+    matches = []
+    position = bisect_left(keys, prefix)
+    while position < len(keys) and keys[position].startswith(prefix):
+        matches.append(index['entries'][position])
+        position += 1
+
+    matches.sort(key=lambda item: -item[1])
+    return [location for location, n in matches[:limit]]
+
+
+def invalidate_locations():
+
+    """
+    Make every process build the locations again
+    """
+
+    bump_generation(LOCATIONS)
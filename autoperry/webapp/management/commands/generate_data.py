@@ -0,0 +1,163 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+import datetime
+import random
+import uuid
+
+from webapp.caching import bump_generation, EVENT_VERSIONS, MODEL_GENERATIONS
+from webapp.locations import invalidate_locations
+from webapp.models import Event, MonthSummary, Volunteer
+from webapp.ranking import invalidate_helper_ranking
+
+PLACES = ['Little Shelford', 'Great Shelford', 'Whittlesford', 'Stapleford', 'Newton', 'Harston',
+          'Hauxton', 'Trumpington', 'Grantchester', 'Coton', 'Madingley', 'Comberton', 'Barton',
+          'Haslingfield', 'Barrington', 'Foxton', 'Fowlmere', 'Thriplow', 'Duxford', 'Sawston',
+          'Pampisford', 'Linton', 'Balsham', 'Fulbourn', 'Teversham', 'Cherry Hinton', 'Histon',
+          'Impington', 'Milton', 'Waterbeach', 'Cottenham', 'Over', 'Swavesey', 'Elsworth', 'Bourn']
+
+DEDICATIONS = ['St Mary', 'St Andrew', 'St Peter', 'All Saints', 'St John', 'St Michael',
+               'Holy Trinity', 'St Botolph', 'St Margaret']
+
+FIRST_NAMES = ['Denise', 'Geoff', 'Fiona', 'Alan', 'Brenda', 'Colin', 'Diana', 'Edward',
+               'Frances', 'Gordon', 'Helen', 'Ian', 'Julia', 'Keith', 'Linda', 'Martin']
+
+LAST_NAMES = ['Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Johnson', 'Davies',
+              'Robinson', 'Wright', 'Thompson', 'Evans', 'Walker', 'White', 'Roberts', 'Green']
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, events and volunteers for benchmarking and development'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--really',
+            action='store_true',
+            help='Actually update the database',
+        )
+        parser.add_argument(
+            '--append',
+            action='store_true',
+            help='Add to a database that already has events',
+        )
+        parser.add_argument('--users', type=int, default=2000, help='Number of users to create')
+        parser.add_argument('--events', type=int, default=20000, help='Number of events to create')
+        parser.add_argument('--years', type=int, default=4, help='Number of years of past events')
+        parser.add_argument('--seed', type=int, default=1960, help='Random number seed')
+
+    def users(self, n, first, now, rng):
+
+        """
+        Build n users numbered from first, a few of them cancelled or
+        suspended
+        """
+
+        password = make_password(None)
+        users = []
+        for i in range(first, first + n):
+            joined = now - datetime.timedelta(days=rng.randint(0, 365*5))
+            users.append(get_user_model()(
+                email=f'synthetic{i}@autoperry.invalid',
+                password=password,
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=f'{rng.choice(LAST_NAMES)} {i}',
+                tower=rng.choice(PLACES),
+                date_joined=joined,
+                email_validated=joined,
+                approved=joined,
+                cancelled=now if rng.random() < 0.01 else None,
+                suspended=now if rng.random() < 0.005 else None,
+                send_notifications=rng.random() < 0.8,
+                uuid=uuid.uuid4().hex))
+        return users
+
+    def events(self, n, owners, locations, now, years, rng):
+
+        """
+        Build n evening events spread from years ago to three months
+        ahead, mostly at their owner's favourite location
+        """
+
+        first = now - datetime.timedelta(days=365*years)
+        span = (now + datetime.timedelta(weeks=13) - first).days
+        favourite = {owner: rng.choice(locations) for owner in owners}
+        weights = [rng.paretovariate(1.5) for owner in owners]
+
+        events = []
+        for owner in rng.choices(owners, weights, k=n):
+            day = first + datetime.timedelta(days=rng.randrange(span))
+            start = day.replace(hour=rng.choice([18, 19, 19, 19, 20]), minute=rng.choice([0, 0, 30]), second=0, microsecond=0)
+            events.append(Event(
+                start=start,
+                end=start + datetime.timedelta(minutes=rng.choice([60, 90, 90, 120])),
+                location=favourite[owner] if rng.random() < 0.8 else rng.choice(locations),
+                helpers_required=rng.randint(1, 6),
+                owner_id=owner,
+                cancelled=start - datetime.timedelta(days=2) if rng.random() < 0.05 else None,
+                owner_reminded=start - datetime.timedelta(days=1) if start < now else None,
+                alerts=rng.random() < 0.5,
+                notes=rng.choice(['', 'Call changes', 'Plain Bob', 'Grandsire', 'Stedman', 'Learners'])))
+        return events
+
+    def volunteers(self, events, helpers, rng):
+
+        """
+        Build volunteers for events, from a pool of helpers where a few
+        do most of the helping, with some withdrawn or declined
+        """
+
+        weights = [rng.paretovariate(1.2) for helper in helpers]
+        volunteers = []
+        for event_id, start, required in events:
+            wanted = rng.randint(0, required + 1)
+            for person in set(rng.choices(helpers, weights, k=wanted)):
+                chance = rng.random()
+                volunteers.append(Volunteer(
+                    event_id=event_id,
+                    person_id=person,
+                    withdrawn=start - datetime.timedelta(days=1) if chance < 0.08 else None,
+                    declined=start - datetime.timedelta(days=1) if 0.08 <= chance < 0.11 else None))
+        return volunteers
+
+    def handle(self, *args, **options):
+
+        if Event.objects.exists() and not options['append']:
+            raise CommandError('The database already has events - use --append to add to them')
+
+        if not options['really']:
+            self.stdout.write(self.style.NOTICE(
+                f'Need to create {options["users"]} users and {options["events"]} events over {options["years"]} years'))
+            return
+
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        locations = [f'{place}, {rng.choice(DEDICATIONS)}' if rng.random() < 0.3 else place for place in PLACES]
+        user_model = get_user_model()
+
+        with transaction.atomic():
+
+            first_user = user_model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            user_model.objects.bulk_create(self.users(options['users'], first_user, now, rng), batch_size=1000)
+            user_ids = list(user_model.objects.filter(pk__gt=first_user).order_by('pk').values_list('pk', flat=True))
+
+            owners = rng.sample(user_ids, max(1, len(user_ids) // 10))
+            first_event = Event.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            Event.objects.bulk_create(self.events(options['events'], owners, locations, now, options['years'], rng), batch_size=1000)
+
+            events = Event.objects.filter(pk__gt=first_event).order_by('pk').values_list('pk', 'start', 'helpers_required')
+            Volunteer.objects.bulk_create(self.volunteers(events, user_ids, rng), batch_size=1000)
+
+            # None of the above sent signals, so bring everything derived up to date
+            Event.objects.filter(pk__gt=first_event).update_helper_counts()
+            MonthSummary.objects.all().delete()
+            invalidate_helper_ranking()
+            invalidate_locations()
+            for name in MODEL_GENERATIONS + (EVENT_VERSIONS, 'my_events'):
+                bump_generation(name)
+
+        self.stdout.write(self.style.NOTICE(
+            f'Created {len(user_ids)} users, {Event.objects.filter(pk__gt=first_event).count()} events and '
+            f'{Volunteer.objects.filter(event__pk__gt=first_event).count()} volunteers'))
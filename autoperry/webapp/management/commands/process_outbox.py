@@ -0,0 +1,123 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+import datetime
+import smtplib
+
+from webapp.models import OutboxMessage
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Retry failures after 5 minutes, then 10, 20, ... giving up after
+# MAX_ATTEMPTS (about 10 hours in total)
+BACKOFF = datetime.timedelta(minutes=5)
+MAX_ATTEMPTS = 8
+
+# Messages claimed by a run are hidden from other runs for this long
+LEASE = datetime.timedelta(minutes=10)
+
+# Sent messages are kept this long before being deleted
+KEEP = datetime.timedelta(days=28)
+
+class Command(BaseCommand):
+    help = 'Deliver queued email from the outbox'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--really',
+            action='store_true',
+            help='Actually send mail and update the database',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=100,
+            help='Number of messages to send over each connection',
+        )
+
+    def due(self, now):
+
+        return (OutboxMessage.objects
+            .filter(sent=None)
+            .filter(attempts__lt=MAX_ATTEMPTS)
+            .filter(next_attempt__lte=now))
+
+    def claim(self, now, batch):
+
+        """
+        Take the next batch of due messages and push their next attempt
+        past the lease so a concurrent run won't send them too
+        """
+
+        with transaction.atomic():
+            messages = list(self.due(now).select_for_update(skip_locked=True)[:batch])
+            OutboxMessage.objects.filter(pk__in=[m.pk for m in messages]).update(next_attempt=now + LEASE)
+        return messages
+
+    def sent(self, message):
+
+        message.sent = timezone.now()
+        message.save(update_fields=['sent'])
+        logger.info(f'Emailed "{", ".join(message.recipients)}" "{message.subject}"')
+
+    def failed(self, message, error):
+
+        message.attempts += 1
+        message.last_error = str(error)
+        message.next_attempt = timezone.now() + BACKOFF * 2**(message.attempts - 1)
+        message.save(update_fields=['attempts', 'last_error', 'next_attempt'])
+        if message.attempts >= MAX_ATTEMPTS:
+            logger.error(f'Giving up emailing "{", ".join(message.recipients)}" "{message.subject}": {error}')
+        else:
+            logger.warning(f'Failed to email "{", ".join(message.recipients)}" "{message.subject}" (attempt {message.attempts}): {error}')
+
+    def deliver(self, messages):
+
+        """
+        Send messages over one connection, recording each one as sent
+        or failed as soon as it has been tried, so that a run that stops
+        part way through doesn't send them again. Anything that goes
+        wrong with a message (a bad header, say) is a failure of that
+        message alone
+        """
+
+        tried = 0
+        try:
+            with get_connection() as connection:
+                for message in messages:
+                    try:
+                        connection.send_messages([message.message()])
+                    except Exception as e:
+                        self.failed(message, e)
+                    else:
+                        self.sent(message)
+                    tried += 1
+        except (smtplib.SMTPException, OSError) as e:
+            # Couldn't connect - everything not already tried failed
+            for message in messages[tried:]:
+                self.failed(message, e)
+
+    def handle(self, *args, **options):
+
+        now = timezone.now()
+
+        if not options['really']:
+            for message in self.due(now):
+                self.stdout.write(self.style.NOTICE(f'Need to send {message}'))
+            return
+
+        while True:
+
+            messages = self.claim(now, options['batch'])
+            if not messages:
+                break
+
+            self.deliver(messages)
+
+        purged, _ = OutboxMessage.objects.filter(sent__lt=now - KEEP).delete()
+        if purged:
+            self.stdout.write(self.style.NOTICE(f'Deleted {purged} old sent messages'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from webapp.models import MonthSummary
+from webapp.util import materialise_month_summaries
+
+class Command(BaseCommand):
+    help = 'Discard and recompute the stored monthly statistics'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--really',
+            action='store_true',
+            help='Actually update the database',
+        )
+
+    def handle(self, *args, **options):
+
+        month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        if options['really']:
+
+            with transaction.atomic():
+                MonthSummary.objects.all().delete()
+                materialise_month_summaries(month_start)
+
+            self.stdout.write(self.style.NOTICE(f'Rebuilt statistics for {MonthSummary.objects.count()} months before {month_start}'))
+
+        else:
+            self.stdout.write(self.style.NOTICE(f'Need to rebuild statistics for {MonthSummary.objects.count()} stored months before {month_start}'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from webapp.caching import bump_event_versions, bump_generation, EVENT
+from webapp.models import Event
+
+class Command(BaseCommand):
+    help = 'Recompute the stored current helper count on events from Volunteer records'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--really',
+            action='store_true',
+            help='Actually update the database',
+        )
+
+    def handle(self, *args, **options):
+
+        with transaction.atomic():
+
+            events = (Event.objects.all()
+                .annotate(helpers_available=Count('volunteer', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))))
+                .order_by('start'))
+
+            wrong = [event for event in events if event.helpers_available != event.current_helper_count]
+
+            for event in wrong:
+                self.stdout.write(self.style.NOTICE(f'"{event}" has {event.current_helper_count} helpers recorded, should be {event.helpers_available}'))
+
+            if not wrong:
+                self.stdout.write(self.style.NOTICE('All helper counts are correct'))
+
+            elif options['really']:
+                # A bulk update sends no signals, so start new versions of
+                # the repaired events ourselves
+                pks = [event.pk for event in wrong]
+                Event.objects.filter(pk__in=pks).update_helper_counts()
+                bump_generation(EVENT)
+                bump_event_versions(*pks)
+                self.stdout.write(self.style.NOTICE(f'Repaired helper counts for {len(wrong)} events'))
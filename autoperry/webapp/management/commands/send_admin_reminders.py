@@ -2,12 +2,11 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.core.mail import send_mail
 
 import datetime
 
 from webapp.models import Event
-from webapp.util import send_template_email
+from webapp.util import send_template_emails
 
 class Command(BaseCommand):
     help = 'Send email reminders to administrators'
@@ -38,6 +37,6 @@ class Command(BaseCommand):
         if users:
 
             if options['really']:
-                send_template_email(settings.DEFAULT_FROM_EMAIL, "account-approval-reminder", { "users": users })
+                send_template_emails([(settings.DEFAULT_FROM_EMAIL, "account-approval-reminder", { "users": users })])
             else:
                 self.stdout.write(self.style.NOTICE(f'Approval needed for {len(users)} accounts'))
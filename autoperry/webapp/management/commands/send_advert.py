@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.core.mail import EmailMessage
 from django.core.management.base import BaseCommand
-from django.db.models import Count, F, Q
+from django.db.models import F
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.core.mail import send_mail
@@ -44,8 +44,7 @@ class Command(BaseCommand):
                   .filter(start__gte=now)
                   .filter(start__lte=cutoff)
                   .filter(cancelled=None)
-                  .annotate(helpers_available=Count('volunteer', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))))
-                  .filter(helpers_required__gt=F("helpers_available"))
+                  .filter(helpers_required__gt=F("current_helper_count"))
                   .order_by('start', 'location'))
 
         if not events:
@@ -1,12 +1,13 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.core.mail import send_mail
+
+from itertools import groupby
 
 import datetime
 
-from webapp.models import Event
+from webapp.models import Volunteer
 from custom_user.models import User
-from webapp.util import send_template_email
+from webapp.util import send_template_emails
 
 class Command(BaseCommand):
     help = 'Send email reminders to event helpers'
@@ -47,26 +48,36 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.NOTICE(f'Date range is is {start} .. {cutoff}'))
 
-        users = (User.objects.all()
-            .filter(is_active=True)
-            .filter(send_notifications=True))
+        # All current volunteering for events in the window by users who
+        # want reminders, in one query, grouped by user below
+        volunteers = (Volunteer.objects.current()
+            .filter(person__is_active=True)
+            .filter(person__send_notifications=True)
+            .filter(event__cancelled=None)
+            .filter(event__start__gt=start)
+            .filter(event__start__lt=cutoff)
+            .select_related('person', 'event', 'event__owner')
+            .order_by('person', 'event__start'))
+
+        emails = []
+        reminded = []
 
-        for user in users:
+        for user, group in groupby(volunteers, key=lambda v: v.person):
 
-            events = (Event.objects.all()
-                .filter(volunteer__person=user, volunteer__withdrawn=None, volunteer__declined=None)
-                .filter(cancelled=None)
-                .filter(start__gt=start)
-                .filter(start__lt=cutoff))
+            events = [volunteer.event for volunteer in group]
 
-            if events:
+            if options['really']:
+                emails.append((user, "helper-reminder",
+                    { "events": events, 'start': start,'last_day': last_day, 'this_week': options['thisweek'] }))
+                reminded.append(user.pk)
 
-                if options['really']:
-                    send_template_email(user, "helper-reminder",
-                        { "events": events, 'start': start,'last_day': last_day, 'this_week': options['thisweek'] })
+            else:
+                self.stdout.write(self.style.NOTICE(f'Need to reminded {user} about {len(events)} events from {start} to {cutoff}'))
 
-                    user.reminded_upto = cutoff
-                    user.save()
+        # Only record the reminders that went, so that the rest are
+        # tried again next time
+        failed = send_template_emails(emails)
+        reminded = [pk for pk, entry in zip(reminded, emails) if entry not in failed]
 
-                else:
-                    self.stdout.write(self.style.NOTICE(f'Need to reminded {user} about {len(events)} events from {start} to {cutoff}'))
+        if reminded:
+            User.objects.filter(pk__in=reminded).update(reminded_upto=cutoff)
@@ -1,11 +1,11 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.core.mail import send_mail
 
 import datetime
 
+from webapp.caching import bump_event_versions, bump_generation, EVENT
 from webapp.models import Event
-from webapp.util import send_template_email
+from webapp.util import send_template_emails
 
 class Command(BaseCommand):
     help = 'Send email reminders to event owners'
@@ -35,15 +35,27 @@ class Command(BaseCommand):
             .filter(cancelled=None)
             .filter(start__gt=timezone.now())
             .filter(start__lte=cutoff)
-            .filter(owner_reminded=None))
+            .filter(owner_reminded=None)
+            .select_related('owner'))
+
+        emails = []
+        reminded = []
 
         for event in events:
 
             if options['really']:
-                send_template_email(event.owner, "event-reminder", { "event": event })
-
-                event.owner_reminded = now
-                event.save()
+                emails.append((event.owner, "event-reminder", { "event": event }))
+                reminded.append(event.pk)
 
             else:
-                self.stdout.write(self.style.NOTICE(f'Need to remind {event.owner} about {event}'))
\ No newline at end of file
+                self.stdout.write(self.style.NOTICE(f'Need to remind {event.owner} about {event}'))
+
+        # Only record the reminders that went, so that the rest are
+        # tried again next time
+        failed = send_template_emails(emails)
+        reminded = [pk for pk, entry in zip(reminded, emails) if entry not in failed]
+
+        if reminded:
+            Event.objects.filter(pk__in=reminded).update(owner_reminded=now)
+            bump_generation(EVENT)
+            bump_event_versions(*reminded)
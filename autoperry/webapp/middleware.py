@@ -1,10 +1,19 @@
 from django.conf import settings
+from django.db import connections
 from django.middleware.common import BrokenLinkEmailsMiddleware
 from django.http import HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
 from django.urls import is_valid_path
 
+from contextlib import ExitStack
+from contextvars import ContextVar
 from urllib.parse import urlparse
 
+import time
+
+import logging
+timing_logger = logging.getLogger('webapp.timing')
+
 class MyBrokenLinkEmailsMiddleware(BrokenLinkEmailsMiddleware):
 
     """
@@ -63,3 +72,109 @@ class BlockIPMiddleware:
             return HttpResponseForbidden("Access Denied")
 
         return self.get_response(request)
+
+
+# Timings for the request being handled, if any
+current_timings = ContextVar('current_timings', default=None)
+
+class Timings:
+
+    """
+    Accumulate the number and duration of SQL queries, and the time
+    spent rendering templates, for one request. Instances are used as
+    database execute wrappers
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.templates = 0.0
+        self.rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        begin = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - begin
+
+
+class TimedTemplate(Template):
+
+    """
+    Template that adds the time taken to render it to the current
+    request's Timings. This includes any queries run while rendering
+    """
+
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None or timings.rendering:
+            return super().render(context, request)
+        timings.rendering += 1
+        begin = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.templates += time.perf_counter() - begin
+            timings.rendering -= 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+
+    """
+    The standard template backend, but returning TimedTemplates so
+    that TimingMiddleware can report rendering time. Selected as the
+    BACKEND in settings.TEMPLATES
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class TimingMiddleware:
+
+    """
+    Record the number of SQL queries, time spent in the database and
+    rendering templates, and total time for each request. Log them
+    against the view name to the 'webapp.timing' logger if
+    settings.WEBAPP_TIMING_LOG is set and, for staff
+    or when DEBUG is on, return them in a Server-Timing header. Template
+    times need the TimedDjangoTemplates backend. For streaming responses
+    the times don't include generating the content
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = Timings()
+        token = current_timings.set(timings)
+        begin = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - begin
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else '-'
+
+        if getattr(settings, 'WEBAPP_TIMING_LOG', False):
+            timing_logger.info(f'view={view} method={request.method} status={response.status_code} '
+                f'queries={timings.queries} db_ms={timings.db*1000:.1f} '
+                f'template_ms={timings.templates*1000:.1f} total_ms={total*1000:.1f} '
+                f'path="{request.path}"')
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = (f'db;dur={timings.db*1000:.1f};desc="{timings.queries} queries", '
+                f'tpl;dur={timings.templates*1000:.1f}, total;dur={total*1000:.1f}')
+
+        return response
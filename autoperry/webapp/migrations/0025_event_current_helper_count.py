@@ -0,0 +1,34 @@
+# Generated by Django 5.2.16 on 2026-10-18 09:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+def populate_current_helper_count(apps, schema_editor):
+    # We can't import the Event model directly as it may be a newer
+    # version than this migration expects. We use the historical version.
+    Event = apps.get_model('webapp', 'Event')
+    Volunteer = apps.get_model('webapp', 'Volunteer')
+    current = (Volunteer.objects
+        .filter(event=OuterRef('pk'), withdrawn=None, declined=None)
+        .order_by()
+        .values('event')
+        .annotate(n=Count('pk'))
+        .values('n'))
+    Event.objects.update(current_helper_count=Coalesce(Subquery(current), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0024_auto_20230222_1414'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='current_helper_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='Number of current helpers, maintained from Volunteer'),
+        ),
+        migrations.RunPython(populate_current_helper_count, migrations.RunPython.noop),
+    ]
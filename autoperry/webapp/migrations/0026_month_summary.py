@@ -0,0 +1,40 @@
+# Generated by Django 5.2.16 on 2026-10-18 09:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0025_event_current_helper_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateTimeField(unique=True)),
+                ('events', models.IntegerField(default=0)),
+                ('cancelled_events', models.IntegerField(default=0)),
+                ('owners', models.IntegerField(default=0)),
+                ('locations', models.IntegerField(default=0)),
+                ('helpers_wanted', models.IntegerField(blank=True, null=True)),
+                ('helpers_provided', models.IntegerField(default=0)),
+                ('distinct_helpers', models.IntegerField(default=0)),
+                ('helpers_cancelled', models.IntegerField(default=0)),
+                ('helpers_withdrawn', models.IntegerField(default=0)),
+                ('helpers_declined', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'month summaries',
+                'ordering': ['month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start'], name='start_index'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.16 on 2026-10-18 10:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+def withdraw_duplicate_offers(apps, schema_editor):
+    # Keep the first of several current offers from the same person
+    # for the same event, so that the constraint below can be added
+    Event = apps.get_model('webapp', 'Event')
+    Volunteer = apps.get_model('webapp', 'Volunteer')
+    duplicates = (Volunteer.objects
+        .filter(withdrawn=None, declined=None)
+        .values('event', 'person')
+        .annotate(n=Count('pk'), first=Min('pk'))
+        .filter(n__gt=1))
+    events = set()
+    for duplicate in duplicates:
+        (Volunteer.objects
+            .filter(event=duplicate['event'], person=duplicate['person'], withdrawn=None, declined=None)
+            .exclude(pk=duplicate['first'])
+            .update(withdrawn=timezone.now()))
+        events.add(duplicate['event'])
+    current = (Volunteer.objects
+        .filter(event=OuterRef('pk'), withdrawn=None, declined=None)
+        .order_by()
+        .values('event')
+        .annotate(n=Count('pk'))
+        .values('n'))
+    Event.objects.filter(pk__in=events).update(current_helper_count=Coalesce(Subquery(current), 0))
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0028_clash_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='volunteer',
+            name='event_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='volunteer',
+            name='person_current_index',
+        ),
+        migrations.AddIndex(
+            model_name='volunteer',
+            index=models.Index(condition=models.Q(('declined', None), ('withdrawn', None)), fields=['person', 'event'], name='current_person_event_index'),
+        ),
+        migrations.RunPython(withdraw_duplicate_offers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='volunteer',
+            constraint=models.UniqueConstraint(condition=models.Q(('declined', None), ('withdrawn', None)), fields=('event', 'person'), name='one_current_offer'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.16 on 2026-10-18 11:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0029_current_volunteer_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='volunteer',
+            name='current_person_event_index',
+        ),
+        migrations.AddIndex(
+            model_name='volunteer',
+            index=models.Index(condition=models.Q(('declined', None), ('withdrawn', None)), fields=['person', 'withdrawn', 'declined', 'event'], name='current_person_index'),
+        ),
+    ]
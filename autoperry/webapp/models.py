@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.dateformat import format
 from django.template.defaultfilters import force_escape, urlize
@@ -10,10 +13,39 @@ from django.urls import reverse
 import datetime
 
 from custom_user.models import User
+from .caching import event_versions
 
 
 # Create your models here.
 
+class EventQuerySet(models.QuerySet):
+
+    """
+    Add a custom method to recompute the stored count of current helpers
+    for every event in the QuerySet from the underlying Volunteer records,
+    and one to load events along with everything the event pages need
+    """
+
+    def with_helpers(self):
+        """
+        Fetch each event's owner with it, and prefetch its volunteer
+        records with their people, so that contact_info, current_helpers,
+        has_current_helper and current_volunteer don't need queries of
+        their own. Two queries in all
+        """
+        return (self.select_related('owner')
+            .prefetch_related(Prefetch('volunteer_set', queryset=Volunteer.objects.select_related('person'))))
+
+    def update_helper_counts(self):
+        current = (Volunteer.objects.current()
+            .filter(event=OuterRef('pk'))
+            .order_by()
+            .values('event')
+            .annotate(n=Count('pk'))
+            .values('n'))
+        return self.update(current_helper_count=Coalesce(Subquery(current), 0))
+
+
 class Event(models.Model):
     start = models.DateTimeField(blank=False)
     end = models.DateTimeField(blank=False, null=True)
@@ -27,25 +59,61 @@ class Event(models.Model):
     notes = models.CharField(max_length=200, blank=True, null=True, help_text="Purpose of the event, helper skills required, etc.")
     owner_reminded = models.DateTimeField(null=True, blank=True)
     alerts = models.BooleanField(default=False)
+    current_helper_count = models.IntegerField(default=0, db_index=True, editable=False, help_text="Number of current helpers, maintained from Volunteer")
+
+    objects = EventQuerySet.as_manager()
 
     # Also
     #
     # volunteer_set (filter volunteer) to access the individual volunteering records
 
+    def save(self, *args, **kwargs):
+        """
+        current_helper_count is maintained by UPDATEs whenever the
+        volunteering changes, so when saving an existing event don't
+        write back the value loaded with this instance, which may be
+        out of date
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'current_helper_count']
+        super().save(*args, **kwargs)
+
+    def has_prefetched_volunteers(self):
+        """
+        Were the volunteer records loaded by EventQuerySet.with_helpers()?
+        """
+        return 'volunteer_set' in getattr(self, '_prefetched_objects_cache', {})
+
+    def current_volunteer(self, user):
+        """
+        Return user's current (so not withdrawn, not declined)
+        volunteer record for this event, or None
+        """
+        if self.has_prefetched_volunteers():
+            for volunteer in self.volunteer_set.all():
+                if volunteer.person_id == user.pk and volunteer.current:
+                    return volunteer
+            return None
+        return self.volunteer_set.current().filter(person=user).first()
+
     def has_current_helper(self, user):
         """
         tests if user is a current (so not withdrawn, not declined)
         helpers for an event
         """
-        return bool(self.volunteer_set.current().filter(person=user))
+        return self.current_volunteer(user) is not None
 
 
     @property
     def current_helpers(self):
         """
         Return a QuerySet representing all current (so not withdrawn,
-        not declined) helpers for this event
+        not declined) helpers for this event, or a list of them if the
+        volunteer records have been prefetched
         """
+        if self.has_prefetched_volunteers():
+            return [volunteer.person for volunteer in self.volunteer_set.all() if volunteer.current]
         return (get_user_model().objects.
             filter(
                 volunteer__event=self,
@@ -55,11 +123,21 @@ class Event(models.Model):
        )
 
     @property
+    @admin.display(ordering='current_helper_count')
     def n_helpers_available(self):
         """
         Return the number of current helpers
         """
-        return len(self.current_helpers)
+        return self.current_helper_count
+
+
+    def update_helper_count(self):
+        """
+        Recompute the stored count of current helpers in a single
+        UPDATE and refresh it on this instance
+        """
+        Event.objects.filter(pk=self.pk).update_helper_counts()
+        self.refresh_from_db(fields=['current_helper_count'])
 
 
     @property
@@ -94,7 +172,7 @@ class Event(models.Model):
 
 
     @property
-    @admin.display(boolean=True)
+    @admin.display(boolean=True, ordering='start')
     def past(self):
         """
         Is this event in the past?
@@ -104,7 +182,7 @@ class Event(models.Model):
         return False
 
     @property
-    @admin.display(boolean=True)
+    @admin.display(boolean=True, ordering='cancelled')
     def is_cancelled(self):
         """
         Has this event been cancelled?
@@ -119,7 +197,7 @@ class Event(models.Model):
         Does this event still need helpers?
         """
         if self.helpers_required:
-            return self.helpers_required > len(self.volunteer_set.current()) and not self.cancelled and not self.past
+            return self.helpers_required > self.current_helper_count and not self.cancelled and not self.past
         return True
 
     @property
@@ -158,6 +236,16 @@ class Event(models.Model):
                 '-' +
                 format(end, f"g:i{include_am}"))
 
+    @property
+    def version(self):
+        """
+        Version of this event for keying cached template fragments,
+        changed by any change to it or its volunteers
+        """
+        if not hasattr(self, '_version'):
+            self._version = event_versions([self.pk])[self.pk]
+        return self._version
+
     def get_absolute_url(self):
         return reverse('event-details', args=[self.pk])
 
@@ -166,6 +254,10 @@ class Event(models.Model):
 
     class Meta:
         ordering = ["start"]
+        indexes = [
+            models.Index(fields=['start'], name='start_index'),
+            models.Index(fields=['location', 'cancelled', 'start', 'end'], name='clash_index'),
+        ]
 
 
 class VolunteerManager(models.Manager):
@@ -198,5 +290,77 @@ class Volunteer(models.Model):
 
     class Meta:
         ordering = ["created"]
-        indexes = [models.Index(fields=['event'], name='event_index')]
+        # Nearly every query is for current offers. MySQL doesn't support
+        # conditions on indexes or unique constraints, so expect check
+        # warnings models.W036 and W037 there:
+        #  - The index is partial elsewhere. MySQL ignores the condition
+        #    and builds it on all rows, so withdrawn and declined are
+        #    included for it to find current offers by
+        #  - MySQL doesn't create the constraint at all, and relies on
+        #    util.add_helper() checking for a current offer while it
+        #    holds the event's row lock. Events are found by the foreign
+        #    key index
+        indexes = [
+            models.Index(fields=['person', 'withdrawn', 'declined', 'event'], condition=Q(withdrawn=None, declined=None), name='current_person_index'),
+        ]
+        constraints = [
+            # Also serves as the (event, person) index of current offers
+            models.UniqueConstraint(fields=['event', 'person'], condition=Q(withdrawn=None, declined=None), name='one_current_offer'),
+        ]
+
+
+
+class MonthSummary(models.Model):
+
+    """
+    Statistics for a completed month, materialised by
+    webapp.util.build_stats_screen so they are only computed once
+    """
+
+    month = models.DateTimeField(unique=True)
+    events = models.IntegerField(default=0)
+    cancelled_events = models.IntegerField(default=0)
+    owners = models.IntegerField(default=0)
+    locations = models.IntegerField(default=0)
+    helpers_wanted = models.IntegerField(null=True, blank=True)
+    helpers_provided = models.IntegerField(default=0)
+    distinct_helpers = models.IntegerField(default=0)
+    helpers_cancelled = models.IntegerField(default=0)
+    helpers_withdrawn = models.IntegerField(default=0)
+    helpers_declined = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{format(self.month, "M Y")} [#{self.pk}]'
+
+    class Meta:
+        ordering = ["month"]
+        verbose_name_plural = "month summaries"
 
+
+class OutboxMessage(models.Model):
+
+    """
+    An email waiting to be delivered by the process_outbox management
+    command, so that requests don't wait on the mail server
+    """
+
+    created = models.DateTimeField(auto_now_add=True)
+    recipients = models.JSONField()
+    subject = models.TextField()
+    body = models.TextField()
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{", ".join(self.recipients)}: {self.subject} [#{self.pk}]'
+
+    def message(self):
+        return EmailMessage(self.subject, self.body, None, self.recipients)
+
+    class Meta:
+        ordering = ["created"]
+        indexes = [
+            models.Index(fields=['sent', 'next_attempt'], name='outbox_due_index'),
+        ]
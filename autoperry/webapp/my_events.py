@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import cached, generation, now_and_on_commit
+from .models import Volunteer
+
+MY_EVENTS_KEY = 'webapp.my_events.{}.{}'
+
+# Signals delete a user's entry, and bump the 'my_events' generation for
+# changes that can't be pinned to particular users. Entries only expire
+# so that those of users who have stopped looking don't accumulate
+MY_EVENTS_TIMEOUT = 3600
+
+
+def build_my_events(user_id):
+
+    """
+    Return the ids of the events that haven't yet started (including
+    cancelled ones) for which the user is a current (so not withdrawn,
+    not declined) helper. Events that start while this is cached stay
+    in it, so callers should filter on start themselves if it matters
+    """
+
+    return { 'helping': list(Volunteer.objects.current()
+        .filter(person=user_id, event__start__gte=timezone.now())
+        .order_by()
+        .values_list('event', flat=True)) }
+
+
+def key(user_id):
+
+    return MY_EVENTS_KEY.format(user_id, generation('my_events'))
+
+
+def my_events(user):
+
+    """
+    Return the (cached) ids of user's events, as from build_my_events
+    """
+
+    return cached(key(user.pk), lambda: build_my_events(user.pk), MY_EVENTS_TIMEOUT)
+
+
+def invalidate_my_events(*user_ids):
+
+    """
+    Discard the cached events of the given users now, and again once
+    the current transaction commits in case they were rebuilt from
+    uncommitted data
+    """
+
+    now_and_on_commit(lambda: cache.delete_many([key(user_id) for user_id in user_ids]))
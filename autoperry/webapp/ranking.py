@@ -0,0 +1,76 @@
+from django.db.models import Count
+
+from .caching import bump_generation, local_cached
+from .models import Volunteer
+
+# Generation counter bumped whenever the ranking changes
+RANKING = 'helper_ranking'
+
+RANKING_TIMEOUT = 3600
+
+
+def build_helper_ranking():
+
+    """
+    Compute the number of current (so not withdrawn, not declined)
+    volunteering records for every user who has any, and their rank by
+    that number, in a single GROUP BY over Volunteer. Everyone else
+    shares the rank below the last helper.
+    """
+
+    counts = dict(Volunteer.objects.current()
+        .order_by()
+        .values('person')
+        .annotate(n=Count('id'))
+        .values_list('person', 'n'))
+
+    # Equivalent to Rank() - ties share a rank and leave a gap after them
+    ranks = {}
+    previous = None
+    for position, (pk, n) in enumerate(sorted(counts.items(), key=lambda item: -item[1]), start=1):
+        if n != previous:
+            rank = position
+            previous = n
+        ranks[pk] = rank
+
+    return { 'counts': counts, 'ranks': ranks, 'unranked': len(counts) + 1 }
+
+
+def helper_ranking():
+
+    """
+    Return the helper ranking, held in this process's memory so that
+    looking up one user doesn't fetch the whole thing from the cache
+    """
+
+    return local_cached(RANKING, build_helper_ranking, RANKING_TIMEOUT)
+
+
+def invalidate_helper_ranking():
+
+    """
+    Make every process build the ranking again
+    """
+
+    bump_generation(RANKING)
+
+
+def helper_rank(user, ranking=None):
+
+    """
+    Return (number of events helped, rank) for user
+    """
+
+    return helper_rank_by_id(user.pk, ranking)
+
+
+def helper_rank_by_id(pk, ranking=None):
+
+    """
+    Return (number of events helped, rank) for the user with primary key pk
+    """
+
+    if ranking is None:
+        ranking = helper_ranking()
+    return (ranking['counts'].get(pk, 0),
+            ranking['ranks'].get(pk, ranking['unranked']))
@@ -0,0 +1,89 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from custom_user.models import User
+from .caching import bump_event_versions, bump_generation, EVENT, EVENT_VERSIONS, USER, VOLUNTEER
+from .models import Event, Volunteer
+from .locations import invalidate_locations
+from .my_events import invalidate_my_events
+from .ranking import invalidate_helper_ranking
+
+
+@receiver(post_save, sender=Volunteer)
+@receiver(post_delete, sender=Volunteer)
+def volunteer_changed(sender, instance, **kwargs):
+
+    """
+    Keep Event.current_helper_count and the helper ranking in step
+    whenever a Volunteer record is created, withdrawn, declined or
+    deleted (including from the admin)
+    """
+
+    instance.event.update_helper_count()
+    invalidate_helper_ranking()
+    invalidate_my_events(instance.person_id)
+    bump_generation(VOLUNTEER)
+    bump_event_versions(instance.event_id)
+
+
+@receiver(m2m_changed, sender=Event.helpers.through)
+def helpers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+
+    """
+    Event.helpers.add() and friends bulk create Volunteer records
+    without sending post_save, so catch them here
+    """
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    invalidate_helper_ranking()
+    bump_generation(VOLUNTEER)
+
+    if not reverse:
+        instance.update_helper_count()
+        bump_event_versions(instance.pk)
+    elif pk_set:
+        Event.objects.filter(pk__in=pk_set).update_helper_counts()
+        bump_event_versions(*pk_set)
+    else:
+        Event.objects.all().update_helper_counts()
+        bump_generation(EVENT_VERSIONS)
+
+    if reverse:
+        invalidate_my_events(instance.pk)
+    elif pk_set:
+        invalidate_my_events(*pk_set)
+    else:
+        # Cleared, so we don't know who was affected
+        bump_generation('my_events')
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+
+    """
+    Any change to an event may change what appears in calendar feeds
+    and the list of locations in use
+    """
+
+    bump_generation(EVENT)
+    bump_event_versions(instance.pk)
+    invalidate_locations()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+
+    """
+    Names and contact details appear in cached calendar feeds and
+    pages, but logging in (which just updates last_login) changes
+    nothing there
+    """
+
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+
+    bump_generation(USER)
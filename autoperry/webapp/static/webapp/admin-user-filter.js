@@ -0,0 +1,18 @@
+'use strict';
+{
+    // Reload the admin changelist filtered on the user chosen in one
+    // of the autocomplete list filters (webapp.admin.UserAutocompleteFilter).
+    // select2 reports the choice with a jQuery event
+    const $ = django.jQuery;
+    $(function() {
+        $('.user-filter select').on('change', function() {
+            const filter = this.closest('.user-filter');
+            let query = filter.dataset.queryString;
+            if (this.value) {
+                query += (query.length > 1 ? '&' : '') +
+                    encodeURIComponent(filter.dataset.parameter) + '=' + encodeURIComponent(this.value);
+            }
+            window.location.search = query;
+        });
+    });
+}
@@ -0,0 +1,190 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.models import Event, Volunteer
+
+from datetime import timedelta
+
+
+class AdminChangelistTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+        cls.user_model = user_model
+
+        cls.superuser = user_model.objects.create_superuser(
+            email='admin@autoperry.com',
+            password='password',
+            first_name='Fiona',
+            last_name='Administrator',
+            tower='Little Shelford')
+
+    def add_events(self, n):
+
+        """
+        Add n users, each owning an event that the previous user
+        helped with
+        """
+
+        first = self.user_model.objects.count()
+        previous = self.superuser
+        for i in range(first, first + n):
+            user = self.user_model.objects.create_user(
+                email=f'user{i}@autoperry.com',
+                password=None,
+                first_name='Denise',
+                last_name=f'User {i}',
+                tower='Little Shelford',
+                email_validated=timezone.now(),
+                approved=timezone.now())
+            event = Event.objects.create(
+                start=timezone.now() + timedelta(days=i),
+                end=timezone.now() + timedelta(days=i, hours=1),
+                location=f'Tower {i}',
+                helpers_required=2,
+                owner=user)
+            event.helpers.add(previous)
+            previous = user
+
+    def changelist(self, url):
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_event_changelist(self):
+
+        self.client.force_login(self.superuser)
+
+        self.add_events(2)
+        response, few = self.changelist('/django-admin/webapp/event/')
+        self.assertContains(response, 'Tower 1')
+
+        self.add_events(10)
+        response, many = self.changelist('/django-admin/webapp/event/')
+        self.assertContains(response, 'Tower 11')
+        self.assertContains(response, 'User 11')
+
+        self.assertEqual(few, many)
+
+    def test_user_changelist(self):
+
+        self.client.force_login(self.superuser)
+
+        self.add_events(2)
+        response, few = self.changelist('/django-admin/custom_user/user/')
+
+        self.add_events(10)
+        response, many = self.changelist('/django-admin/custom_user/user/')
+        self.assertContains(response, 'User 11')
+
+        self.assertEqual(few, many)
+
+    def test_user_counts(self):
+
+        self.add_events(4)
+        user = self.user_model.objects.get(last_name='User 2')
+        others = list(Event.objects.exclude(owner=user).exclude(helpers=user))
+
+        # Withdrawn offers don't count
+        Volunteer.objects.create(event=others[0], person=user, withdrawn=timezone.now())
+        Volunteer.objects.create(event=others[1], person=user)
+
+        self.client.force_login(self.superuser)
+        # Column 9 is 'events helped'
+        response = self.client.get('/django-admin/custom_user/user/', {'o': '-9'})
+        users = list(response.context['cl'].result_list)
+        self.assertEqual(users[0], user)
+        counts = {u.last_name: (u.helped_count, u.owned_count) for u in users}
+        self.assertEqual(counts['User 2'], (2, 1))
+        self.assertEqual(counts['User 4'], (0, 1))
+        self.assertEqual(counts['Administrator'], (1, 0))
+
+    def test_event_sorting(self):
+
+        self.add_events(3)
+        Event.objects.filter(location='Tower 2').update(helpers_required=5)
+
+        self.client.force_login(self.superuser)
+        # Column 8 is 'helpers needed'
+        response = self.client.get('/django-admin/webapp/event/', {'o': '-8'})
+        events = list(response.context['cl'].result_list)
+        self.assertEqual(events[0].location, 'Tower 2')
+        self.assertEqual(events[0].shortfall, 4)
+
+    def test_user_filters(self):
+
+        self.add_events(12)
+        owner = self.user_model.objects.get(last_name='User 5')
+        helper = self.user_model.objects.get(last_name='User 7')
+        self.client.force_login(self.superuser)
+
+        # Users aren't listed as choices, whatever their number
+        response, few = self.changelist('/django-admin/webapp/event/')
+        self.assertContains(response, 'class="admin-autocomplete"', count=2)
+        for spec in response.context['cl'].filter_specs[-2:]:
+            self.assertEqual(spec.lookup_choices, [])
+        self.add_events(10)
+        response, many = self.changelist('/django-admin/webapp/event/')
+        self.assertEqual(few, many)
+
+        response = self.client.get('/django-admin/webapp/event/', {'owner': owner.pk})
+        self.assertEqual([e.owner for e in response.context['cl'].result_list], [owner])
+        self.assertContains(response, str(owner))
+
+        # Someone who withdrew and volunteered again is listed once
+        event = Event.objects.get(owner__last_name='User 8')
+        Volunteer.objects.filter(event=event, person=helper).update(withdrawn=timezone.now())
+        Volunteer.objects.create(event=event, person=helper)
+        response = self.client.get('/django-admin/webapp/event/', {'helper': helper.pk})
+        self.assertEqual(list(response.context['cl'].result_list), [event])
+
+        # Both together, and nonsense ignored
+        response = self.client.get('/django-admin/webapp/event/', {'helper': helper.pk, 'owner': owner.pk})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        response = self.client.get('/django-admin/webapp/event/', {'helper': 'x'})
+        self.assertEqual(response.context['cl'].result_count, 22)
+
+    def test_autocomplete(self):
+
+        self.add_events(3)
+        self.client.force_login(self.superuser)
+
+        for field in ('owner', 'helpers'):
+            with self.subTest(field):
+                response = self.client.get('/django-admin/autocomplete/',
+                    {'app_label': 'webapp', 'model_name': 'event', 'field_name': field, 'term': 'user 2'})
+                self.assertEqual([r['text'] for r in response.json()['results']], ['Denise User 2 [#3]'])
+
+                response = self.client.get('/django-admin/autocomplete/',
+                    {'app_label': 'webapp', 'model_name': 'event', 'field_name': field, 'term': 'denise user 3'})
+                self.assertEqual([r['text'] for r in response.json()['results']], ['Denise User 3 [#4]'])
+
+                # Names are matched from the start
+                response = self.client.get('/django-admin/autocomplete/',
+                    {'app_label': 'webapp', 'model_name': 'event', 'field_name': field, 'term': 'ser'})
+                self.assertEqual(response.json()['results'], [])
+
+    def test_helper_search(self):
+
+        self.add_events(3)
+        event = Event.objects.get(location='Tower 3')
+        helper = self.user_model.objects.get(last_name='User 2')
+        Volunteer.objects.filter(event=event).update(withdrawn=timezone.now())
+        Volunteer.objects.create(event=event, person=helper)
+        self.client.force_login(self.superuser)
+
+        # Each event once, and no DISTINCT needed to get there
+        response = self.client.get('/django-admin/webapp/event/', {'q': 'User 2'})
+        self.assertEqual({e.location for e in response.context['cl'].result_list}, {'Tower 2', 'Tower 3'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse(response.context['cl'].queryset.query.distinct)
+
+        response = self.client.get('/django-admin/webapp/event/', {'q': 'Tower Administrator'})
+        self.assertEqual([e.location for e in response.context['cl'].result_list], ['Tower 1'])
@@ -0,0 +1,165 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from webapp.caching import bump_generation, cached, generation, local_cached, versioned_key, EVENT, USER, VOLUNTEER
+from webapp.models import Event, Volunteer
+
+from datetime import timedelta
+
+import shutil
+import tempfile
+
+
+class CachingTests:
+
+    """
+    Tests run against each cache backend
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1),
+            location='Little Shelford',
+            helpers_required=2,
+            owner=cls.owner)
+
+    def setUp(self):
+
+        cache.clear()
+
+    def test_generation(self):
+
+        first = generation('test')
+        self.assertEqual(generation('test'), first)
+        bump_generation('test')
+        self.assertNotEqual(generation('test'), first)
+
+        # Survives being evicted without reusing an old value
+        cache.delete('webapp.generation.test')
+        self.assertNotEqual(generation('test'), first)
+
+    def test_cached(self):
+
+        calls = []
+
+        def build():
+            calls.append(1)
+            return None
+
+        self.assertIsNone(cached('webapp.test', build, 60))
+        self.assertIsNone(cached('webapp.test', build, 60))
+        self.assertEqual(len(calls), 1)
+
+    def test_local_cached(self):
+
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(local_cached('test', build, 60), 1)
+        self.assertEqual(local_cached('test', build, 60), 1)
+
+        # Built again once the generation moves on, or after the timeout
+        bump_generation('test')
+        self.assertEqual(local_cached('test', build, 60), 2)
+        self.assertEqual(local_cached('test', build, -1), 3)
+
+    def test_versioned_key(self):
+
+        key = versioned_key('test', 'a', 1)
+        self.assertTrue(key.startswith('webapp.test.a.1.'))
+        self.assertEqual(versioned_key('test', 'a', 1), key)
+        self.assertNotEqual(versioned_key('test', 'a', 2), key)
+        self.assertNotEqual(versioned_key('test', 'a', 1, depends=(EVENT,)), key)
+
+    def assertBumps(self, name, change):
+
+        before = {n: generation(n) for n in (EVENT, VOLUNTEER, USER)}
+        change()
+        after = {n: generation(n) for n in (EVENT, VOLUNTEER, USER)}
+        for n in before:
+            with self.subTest(n):
+                if n == name:
+                    self.assertNotEqual(before[n], after[n])
+                else:
+                    self.assertEqual(before[n], after[n])
+
+    def test_signals(self):
+
+        key = versioned_key('test')
+
+        def save_event():
+            self.event.notes = 'Changed'
+            self.event.save()
+
+        def volunteer():
+            Volunteer.objects.create(event=self.event, person=self.owner)
+
+        def clear_helpers():
+            self.event.helpers.clear()
+
+        def save_user():
+            self.owner.phone_number = '01223 000000'
+            self.owner.save()
+
+        self.assertBumps(EVENT, save_event)
+        self.assertBumps(VOLUNTEER, volunteer)
+        self.assertBumps(VOLUNTEER, clear_helpers)
+        self.assertBumps(USER, save_user)
+        self.assertNotEqual(versioned_key('test'), key)
+
+    def test_login(self):
+
+        # Logging in only touches last_login
+        key = versioned_key('test')
+        self.client.login(username='owner@autoperry.com', password='password')
+        self.assertEqual(versioned_key('test'), key)
+
+
+@override_settings(CACHES={ 'default': { 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                         'LOCATION': 'test-caching' } })
+class LocMemCachingTestCase(CachingTests, TestCase):
+
+    pass
+
+
+class FileBasedCachingTestCase(CachingTests, TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(CACHES={ 'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cls.cache_dir } }))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+
+        super().tearDownClass()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    def test_backend(self):
+
+        from django.core.cache.backends.filebased import FileBasedCache
+        from django.core.cache import caches
+        self.assertIsInstance(caches['default'], FileBasedCache)
@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from webapp.models import Event, Volunteer
+
+from datetime import timedelta
+
+
+class CalendarTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now(),
+            uuid='owner-uuid')
+
+        cls.live = user_model.objects.create_user(
+            email='live@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Live',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now(),
+            uuid='live-uuid')
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1, minutes=30),
+            location='Little Shelford',
+            helpers_required=2,
+            owner=cls.owner,
+            contact_address=None,
+            notes='Ab C#',
+            alerts=True)
+
+    def setUp(self):
+
+        cache.clear()
+
+    def test_feeds(self):
+
+        response = self.client.get('/ical/owner-uuid/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar')
+        self.assertContains(response, 'AutoPerry organising')
+
+        response = self.client.get('/ical/future/live-uuid/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'AutoPerry helpers needed')
+
+        response = self.client.get('/ical/nonsuch/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached(self):
+
+        for url in ('/ical/owner-uuid/', '/ical/future/live-uuid/'):
+            with self.subTest(url):
+                first = self.client.get(url)
+                # Just the user lookup
+                with self.assertNumQueries(1):
+                    second = self.client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_conditional_get(self):
+
+        for url in ('/ical/owner-uuid/', '/ical/future/live-uuid/'):
+            with self.subTest(url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+                response = self.client.get(url, headers={'If-Modified-Since': last_modified})
+                self.assertEqual(response.status_code, 304)
+
+                response = self.client.get(url, headers={'If-None-Match': '"stale"'})
+                self.assertEqual(response.status_code, 200)
+
+    def test_invalidated(self):
+
+        owner_etag = self.client.get('/ical/owner-uuid/')['ETag']
+        response = self.client.get('/ical/live-uuid/')
+        self.assertNotContains(response, 'AutoPerry helping')
+
+        # Volunteering changes both the helper's and the owner's feeds
+        self.event.volunteer_set.create(person=self.live)
+
+        response = self.client.get('/ical/live-uuid/')
+        self.assertContains(response, 'AutoPerry helping')
+        response = self.client.get('/ical/owner-uuid/', headers={'If-None-Match': owner_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Denise Live')
+
+        # As does editing the event
+        self.event.location = 'Whittlesford'
+        self.event.save()
+        self.assertContains(self.client.get('/ical/live-uuid/'), 'Whittlesford')
+
+        # And withdrawing
+        volunteer = Volunteer.objects.get(event=self.event, person=self.live)
+        volunteer.withdrawn = timezone.now()
+        volunteer.save()
+        self.assertNotContains(self.client.get('/ical/live-uuid/'), 'AutoPerry helping')
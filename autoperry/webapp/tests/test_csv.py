@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from webapp.models import Event
+
+from datetime import datetime, timedelta
+
+import csv
+import io
+
+
+class CSVTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.admin_group = Group.objects.create(name='webapp.administrators')
+        permission = Permission.objects.get(codename='administrator')
+        cls.admin_group.permissions.add (permission)
+        cls.admin = user_model.objects.create_user(
+            email='admin@autoperry.com',
+            password='password',
+            first_name='Fiona',
+            last_name='Administrator',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+        cls.admin.groups.add(cls.admin_group)
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.live = user_model.objects.create_user(
+            email='live@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Live',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        base = datetime(1960, 3, 5, hour=14, minute=0)
+
+        cls.event1 = Event.objects.create(
+            start=base,
+            end=base + timedelta(hours=1),
+            location='Little Shelford',
+            helpers_required=2,
+            owner=cls.owner,
+            notes='Ab C#')
+        cls.event1.helpers.add(cls.live, cls.admin)
+
+        cls.event2 = Event.objects.create(
+            start=base + timedelta(days=1),
+            end=base + timedelta(days=1, hours=1),
+            location='Whittlesford',
+            helpers_required=1,
+            owner=cls.owner,
+            cancelled=base)
+        cls.event2.helpers.add(cls.live)
+
+    def setUp(self):
+
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def get_csv(self, url):
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_events_csv(self):
+
+        rows = self.get_csv('/events-csv/')
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['id'], str(self.event1.pk))
+        self.assertEqual(rows[0]['owner'], str(self.owner))
+        self.assertEqual(rows[0]['helpers_provided'], '2')
+        self.assertEqual(rows[0]['start'], '1960-03-05 14:00:00')
+        self.assertEqual(rows[0]['cancelled'], '')
+        self.assertEqual(rows[0]['notes'], 'Ab C#')
+        self.assertEqual(rows[1]['location'], 'Whittlesford')
+        self.assertEqual(rows[1]['helpers_provided'], '1')
+        self.assertEqual(rows[1]['cancelled'], '1960-03-05 14:00:00')
+
+    def test_account_list_csv(self):
+
+        rows = {row['email']: row for row in self.get_csv('/admin/account-list-csv/')}
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows['live@autoperry.com']['helped'], '2')
+        self.assertEqual(rows['live@autoperry.com']['helper_rank'], '1')
+        self.assertEqual(rows['admin@autoperry.com']['helped'], '1')
+        self.assertEqual(rows['admin@autoperry.com']['helper_rank'], '2')
+        self.assertEqual(rows['owner@autoperry.com']['helped'], '0')
+        self.assertEqual(rows['owner@autoperry.com']['helper_rank'], '3')
+        self.assertEqual(rows['owner@autoperry.com']['owned'], '2')
+        self.assertEqual(rows['owner@autoperry.com']['is_active'], 'True')
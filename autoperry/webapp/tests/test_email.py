@@ -0,0 +1,280 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import BadHeaderError
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from webapp.models import Event
+from webapp.util import send_template_emails
+
+from datetime import timedelta
+from io import StringIO
+
+import smtplib
+import socketserver
+import threading
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+
+    """
+    locmem backend that counts the connections it opens
+    """
+
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+class FailingEmailBackend(locmem.EmailBackend):
+
+    """
+    locmem backend that can't reach the mail server
+    """
+
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('No mail server')
+
+
+class FailingNthEmailBackend(locmem.EmailBackend):
+
+    """
+    locmem backend whose mail server refuses the Nth message it's given
+    """
+
+    fail_at = 2
+    sent = 0
+
+    def error(self):
+        return smtplib.SMTPRecipientsRefused({})
+
+    def send_messages(self, messages):
+        FailingNthEmailBackend.sent += 1
+        if FailingNthEmailBackend.sent == self.fail_at:
+            raise self.error()
+        return super().send_messages(messages)
+
+
+class BrokenNthEmailBackend(FailingNthEmailBackend):
+
+    """
+    locmem backend that can't build the Nth message it's given
+    """
+
+    def error(self):
+        return BadHeaderError('Header values can\'t contain newlines')
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    """
+    Just enough of an SMTP server to accept messages from
+    django.core.mail.backends.smtp
+    """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command.startswith('DATA'):
+                self.reply('354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = 0
+
+
+class EmailBatchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1, minutes=30),
+            location='Little Shelford',
+            helpers_required=5,
+            owner=cls.owner)
+
+        cls.helpers = []
+        for i in range(4):
+            helper = user_model.objects.create_user(
+                email=f'helper{i}@autoperry.com',
+                password=None,
+                first_name='Denise',
+                last_name=f'Helper {i}',
+                tower='Little Shelford',
+                email_validated=timezone.now(),
+                approved=timezone.now())
+            cls.event.helpers.add(helper)
+            cls.helpers.append(helper)
+
+    def setUp(self):
+
+        CountingEmailBackend.opened = 0
+
+    def smtp_server(self):
+
+        server = SMTPServer()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    @override_settings(EMAIL_BACKEND='webapp.tests.test_email.CountingEmailBackend')
+    def test_one_connection_per_batch(self):
+
+        send_template_emails([(helper, 'email-email', {}) for helper in self.helpers])
+
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [h.email for h in self.helpers])
+
+    @override_settings(EMAIL_BACKEND='webapp.tests.test_email.BrokenNthEmailBackend')
+    def test_one_broken(self):
+
+        # Errors other than from the mail server only lose that message
+        FailingNthEmailBackend.sent = 0
+        emails = [(helper, 'email-email', {}) for helper in self.helpers]
+        with self.assertLogs('webapp.util', 'ERROR'):
+            failed = send_template_emails(emails)
+
+        self.assertEqual(failed, [emails[1]])
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [h.email for h in self.helpers if h != self.helpers[1]])
+
+    @override_settings(EMAIL_BACKEND='webapp.tests.test_email.CountingEmailBackend')
+    def test_nothing_to_send(self):
+
+        # Users who don't want email are dropped, and an empty batch
+        # doesn't open a connection at all
+        self.helpers[0].send_notifications = False
+        send_template_emails([(self.helpers[0], 'email-email', {})])
+
+        self.assertEqual(CountingEmailBackend.opened, 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_event_cancel_smtp(self):
+
+        server = self.smtp_server()
+
+        self.client.force_login(self.owner)
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST='127.0.0.1',
+                               EMAIL_PORT=server.server_address[1]):
+            response = self.client.post(f'/event/{self.event.pk}/cancel/', { 'confirm': 'Cancel' })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(server.messages, 4)
+
+    def test_reminders_smtp(self):
+
+        server = self.smtp_server()
+
+        # Move the event into the window for owner reminders
+        self.event.start = timezone.now() + timedelta(hours=1)
+        self.event.end = timezone.now() + timedelta(hours=2)
+        self.event.save()
+        second = Event.objects.create(
+            start=timezone.now() + timedelta(hours=3),
+            end=timezone.now() + timedelta(hours=4),
+            location='Whittlesford',
+            helpers_required=5,
+            owner=self.helpers[0])
+
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST='127.0.0.1',
+                               EMAIL_PORT=server.server_address[1]):
+            call_command('send_owner_reminders', '--really', stdout=StringIO())
+
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(server.messages, 2)
+        second.refresh_from_db()
+        self.assertIsNotNone(second.owner_reminded)
+
+    @override_settings(EMAIL_BACKEND='webapp.tests.test_email.FailingEmailBackend')
+    def test_reminders_failed(self):
+
+        self.event.start = timezone.now() + timedelta(hours=1)
+        self.event.end = timezone.now() + timedelta(hours=2)
+        self.event.save()
+
+        # Owners are only marked as reminded once the mail has gone
+        call_command('send_owner_reminders', '--really', stdout=StringIO())
+        self.event.refresh_from_db()
+        self.assertIsNone(self.event.owner_reminded)
+
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            call_command('send_owner_reminders', '--really', stdout=StringIO())
+        self.event.refresh_from_db()
+        self.assertIsNotNone(self.event.owner_reminded)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND='webapp.tests.test_email.FailingNthEmailBackend')
+    def test_reminders_one_failed(self):
+
+        FailingNthEmailBackend.sent = 0
+        for helper in self.helpers:
+            Event.objects.create(
+                start=timezone.now() + timedelta(hours=1),
+                end=timezone.now() + timedelta(hours=2),
+                location=f'Whittlesford {helper.pk}',
+                helpers_required=5,
+                owner=helper)
+        events = list(Event.objects.all())
+        self.assertEqual(len(events), 5)
+
+        # The rest of the batch still goes, and only the owners who were
+        # emailed are marked as reminded
+        with self.assertLogs('webapp.util', 'ERROR'):
+            call_command('send_owner_reminders', '--really', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+        reminded = [event for event in events if Event.objects.get(pk=event.pk).owner_reminded]
+        self.assertEqual(len(reminded), 4)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(event.owner.email for event in reminded))
+
+        # Next time only the one that failed is sent
+        call_command('send_owner_reminders', '--really', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(Event.objects.filter(owner_reminded=None).exists())
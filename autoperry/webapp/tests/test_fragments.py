@@ -0,0 +1,155 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from webapp.caching import event_versions, load_event_versions, EVENT_VERSION_TIMEOUT
+from webapp.models import Event, Volunteer
+
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+
+class FragmentCacheTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.helper = user_model.objects.create_user(
+            email='helper@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Helper',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1),
+            location='Little Shelford',
+            helpers_required=2,
+            owner=cls.owner)
+
+    def setUp(self):
+
+        cache.clear()
+
+    def index(self, user):
+
+        self.client.force_login(user)
+        return self.client.get('/').content.decode()
+
+    def test_versions(self):
+
+        other = Event.objects.create(
+            start=timezone.now() + timedelta(days=2),
+            end=timezone.now() + timedelta(days=2, hours=1),
+            location='Whittlesford',
+            helpers_required=2,
+            owner=self.owner)
+
+        before = event_versions([self.event.pk, other.pk])
+        self.assertEqual(event_versions([self.event.pk, other.pk]), before)
+
+        # Loaded in bulk without touching the cache again
+        events = load_event_versions(Event.objects.filter(pk__in=[self.event.pk, other.pk]))
+        self.assertEqual({event.pk: event.version for event in events}, before)
+
+        # Only the changed event gets a new version
+        self.event.helpers.add(self.helper)
+        after = event_versions([self.event.pk, other.pk])
+        self.assertNotEqual(after[self.event.pk], before[self.event.pk])
+        self.assertEqual(after[other.pk], before[other.pk])
+
+        volunteer = Volunteer.objects.get(event=self.event, person=self.helper)
+        volunteer.withdrawn = timezone.now()
+        volunteer.save()
+        self.assertNotEqual(event_versions([self.event.pk])[self.event.pk], after[self.event.pk])
+
+        other.notes = 'Plain Bob'
+        other.save()
+        self.assertNotEqual(event_versions([other.pk])[other.pk], after[other.pk])
+
+        # Any user change may change names or contact details
+        before = event_versions([self.event.pk, other.pk])
+        self.owner.phone_number = '01223 123456'
+        self.owner.save()
+        after = event_versions([self.event.pk, other.pk])
+        self.assertNotEqual(after[self.event.pk], before[self.event.pk])
+        self.assertNotEqual(after[other.pk], before[other.pk])
+
+    def test_version_timeout(self):
+
+        # Versions expire like the fragments, rather than accumulating
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            event_versions([self.event.pk])
+            event_versions([self.event.pk])
+        set_many.assert_called_once()
+        self.assertEqual(set_many.call_args.args[1], EVENT_VERSION_TIMEOUT)
+
+    def test_list_row(self):
+
+        self.assertIn('0 of 2', self.index(self.owner))
+
+        # An update that bypasses the signals shows the row is cached...
+        Event.objects.filter(pk=self.event.pk).update(helpers_required=3)
+        self.assertIn('0 of 2', self.index(self.owner))
+
+        # ...until the event changes
+        self.event.helpers.add(self.helper)
+        self.assertIn('1 of 3', self.index(self.owner))
+
+    def test_repair_helper_counts(self):
+
+        self.event.helpers.add(self.helper)
+        Event.objects.filter(pk=self.event.pk).update(current_helper_count=0)
+        self.assertIn('0 of 2', self.index(self.owner))
+
+        call_command('repair_helper_counts', '--really', stdout=StringIO())
+        self.assertIn('1 of 2', self.index(self.owner))
+
+    def test_volunteer_button(self):
+
+        # The volunteer button isn't cached with the rest of the row
+        volunteer = f'/event/{self.event.pk}/volunteer/'
+        self.event.helpers.add(self.helper)
+        self.assertIn(volunteer, self.index(self.owner))
+        self.assertNotIn(volunteer, self.index(self.helper))
+        self.assertIn(volunteer, self.index(self.owner))
+
+    def test_event_details(self):
+
+        self.event.helpers.add(self.helper)
+        self.client.force_login(self.helper)
+        url = f'/event/{self.event.pk}/'
+
+        response = self.client.get(url)
+        self.assertContains(response, 'owner@autoperry.com')
+        self.assertContains(response, 'Withdraw offer to help')
+
+        self.owner.phone_number = '01223 123456'
+        self.owner.save()
+        self.assertContains(self.client.get(url), '01223 123456')
+
+        # The owner sees the helper list, and the helper doesn't
+        self.client.force_login(self.owner)
+        response = self.client.get(url)
+        self.assertContains(response, 'helper@autoperry.com')
+        self.assertContains(response, 'Decline')
+
+        self.client.force_login(self.helper)
+        self.assertNotContains(self.client.get(url), 'Decline')
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F, Q
+from django.test import TestCase
+
+from webapp.models import Event, Volunteer
+
+from io import StringIO
+
+
+class GenerateDataTestCase(TestCase):
+
+    def generate(self, *args, **kwargs):
+
+        call_command('generate_data', *args, users=50, events=300, years=1, stdout=StringIO(), **kwargs)
+
+    def test_generate_data(self):
+
+        self.generate()
+        self.assertFalse(Event.objects.exists())
+
+        self.generate('--really')
+        self.assertEqual(get_user_model().objects.count(), 50)
+        self.assertEqual(Event.objects.count(), 300)
+        self.assertTrue(Volunteer.objects.current().exists())
+        self.assertTrue(Volunteer.objects.exclude(withdrawn=None).exists())
+
+        # Stored helper counts match the volunteers
+        wrong = (Event.objects
+            .annotate(n=Count('volunteer', filter=Q(volunteer__withdrawn=None, volunteer__declined=None)))
+            .exclude(n=F('current_helper_count')))
+        self.assertFalse(wrong.exists())
+
+    def test_append(self):
+
+        self.generate('--really')
+        with self.assertRaises(CommandError):
+            self.generate('--really')
+
+        self.generate('--really', '--append', seed=1)
+        self.assertEqual(get_user_model().objects.count(), 100)
+        self.assertEqual(Event.objects.count(), 600)
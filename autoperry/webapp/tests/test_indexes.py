@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from webapp.models import Event, Volunteer
+
+from datetime import timedelta
+from io import StringIO
+
+import unittest
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Checks SQLite query plans')
+class CurrentVolunteerIndexTestCase(TestCase):
+
+    """
+    Check with EXPLAIN that the queries for current volunteers use the
+    partial indexes, against synthetic data that the query planner has
+    statistics for
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+
+        call_command('generate_data', '--really', users=300, events=3000, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        volunteer = Volunteer.objects.current().order_by('pk').first()
+        cls.person = volunteer.person
+        cls.event = volunteer.event
+
+    def assertUsesIndex(self, queryset, index):
+
+        plan = queryset.explain()
+        # 'USING INDEX' or 'USING COVERING INDEX'
+        self.assertIn(f'INDEX {index} ', plan)
+
+    def test_person(self):
+
+        self.assertUsesIndex(Volunteer.objects.current().filter(person=self.person), 'current_person_index')
+        self.assertUsesIndex(
+            Event.objects.filter(volunteer__person=self.person, volunteer__withdrawn=None, volunteer__declined=None),
+            'current_person_index')
+
+    def test_event_and_person(self):
+
+        event = Event.objects.get(pk=self.event.pk)
+        # The (person, withdrawn, declined, event) index matches on all
+        # four columns, so is preferred to the (event, person) constraint
+        self.assertUsesIndex(event.volunteer_set.current().filter(person=self.person), 'current_person_index')
+        self.assertIsNotNone(event.current_volunteer(self.person))
+
+    def test_event(self):
+
+        # An event has only a few offers, which the foreign key index
+        # finds as well as the partial one, but nothing scans the table
+        event = Event.objects.get(pk=self.event.pk)
+        for queryset in (Volunteer.objects.current().filter(event=event), event.current_helpers):
+            self.assertNotIn('SCAN webapp_volunteer', queryset.explain())
+
+
+class OneCurrentOfferTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.helper = user_model.objects.create_user(
+            email='helper@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Helper',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1),
+            location='Little Shelford',
+            helpers_required=2,
+            owner=cls.owner)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "MySQL doesn't create conditional constraints")
+    def test_one_current_offer(self):
+
+        first = Volunteer.objects.create(event=self.event, person=self.helper)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Volunteer.objects.create(event=self.event, person=self.helper)
+
+        # Volunteering again after withdrawing or being declined is fine
+        first.withdrawn = timezone.now()
+        first.save()
+        second = Volunteer.objects.create(event=self.event, person=self.helper)
+        second.declined = timezone.now()
+        second.save()
+        Volunteer.objects.create(event=self.event, person=self.helper)
+
+        self.assertEqual(Volunteer.objects.filter(event=self.event, person=self.helper).count(), 3)
+        self.assertEqual(Volunteer.objects.current().filter(event=self.event, person=self.helper).count(), 1)
@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.locations import build_locations, location_matches, locations, popular_locations
+from webapp.models import Event
+
+from datetime import timedelta
+from unittest import mock
+
+
+class LocationsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        for days, location, cancelled in ((1, 'Whittlesford', None),
+                                          (2, 'Little Shelford', None),
+                                          (3, 'Whittlesford', None),
+                                          (4, 'Newton', None),
+                                          (5, 'Stapleford', timezone.now())):
+            cls.add_event(days, location, cancelled)
+
+    @classmethod
+    def add_event(cls, days, location, cancelled=None):
+
+        start = timezone.now() + timedelta(days=days)
+        return Event.objects.create(
+            start=start,
+            end=start + timedelta(hours=1),
+            location=location,
+            helpers_required=2,
+            owner=cls.owner,
+            cancelled=cancelled)
+
+    def setUp(self):
+
+        cache.clear()
+
+    def test_build_locations(self):
+
+        self.assertEqual(build_locations(),
+            [('Little Shelford', 1), ('Newton', 1), ('Whittlesford', 2)])
+
+    def test_popular_locations(self):
+
+        self.assertEqual(popular_locations(), ['Whittlesford', 'Little Shelford', 'Newton'])
+
+    def test_cached(self):
+
+        locations()
+        with self.assertNumQueries(0):
+            locations()
+
+    def test_one_lookup(self):
+
+        # Once built, a search only needs the generation from the cache
+        locations()
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            self.assertEqual(location_matches('wh'), ['Whittlesford'])
+        get.assert_called_once_with('webapp.generation.locations')
+
+    def test_invalidated(self):
+
+        self.assertNotIn('Harston', popular_locations())
+        event = self.add_event(6, 'Harston')
+        self.assertIn('Harston', popular_locations())
+        event.cancelled = timezone.now()
+        event.save()
+        self.assertNotIn('Harston', popular_locations())
+
+    def test_event_create_form(self):
+
+        # The form page doesn't need the locations at all
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/event/create/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in context.captured_queries if 'webapp_event' in q['sql']])
+        self.assertContains(response, '/api/locations/')
+
+    def test_location_matches(self):
+
+        self.add_event(6, 'Little Eversden')
+        self.add_event(7, 'little shelford')
+        self.add_event(8, 'Little Eversden')
+
+        self.assertEqual(location_matches('lit'), ['Little Eversden', 'Little Shelford', 'little shelford'])
+        self.assertEqual(location_matches(' LITTLE S'), ['Little Shelford', 'little shelford'])
+        self.assertEqual(location_matches('Whittlesford'), ['Whittlesford'])
+        self.assertEqual(location_matches('Whittlesfordd'), [])
+        self.assertEqual(location_matches('z'), [])
+        self.assertEqual(location_matches('little', limit=1), ['Little Eversden'])
+        self.assertEqual(location_matches('')[:2], ['Little Eversden', 'Whittlesford'])
+
+    def test_api_locations(self):
+
+        self.client.force_login(self.owner)
+        response = self.client.get('/api/locations/', { 'q': 'wh' })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), ['Whittlesford'])
+
+        self.client.logout()
+        response = self.client.get('/api/locations/', { 'q': 'wh' })
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.models import Event
+
+from datetime import timedelta
+
+
+@override_settings(WEBAPP_TIMING_LOG=True)
+class TimingMiddlewareTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.live = user_model.objects.create_user(
+            email='live@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Live',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1),
+            location='Little Shelford',
+            helpers_required=2,
+            owner=cls.live)
+
+    def setUp(self):
+
+        self.client.force_login(self.live)
+
+    def test_timing(self):
+
+        self.live.is_staff = True
+        self.live.save()
+
+        with CaptureQueriesContext(connection) as context:
+            with self.assertLogs('webapp.timing') as logs:
+                response = self.client.get('/events/')
+
+        self.assertEqual(response.status_code, 200)
+        queries = len(context.captured_queries)
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('view=events method=GET status=200', logs.output[0])
+        self.assertIn(f' queries={queries} ', logs.output[0])
+        self.assertIn('path="/events/"', logs.output[0])
+
+        header = response['Server-Timing']
+        self.assertRegex(header, rf'^db;dur=[0-9.]+;desc="{queries} queries", tpl;dur=[0-9.]+, total;dur=[0-9.]+$')
+        self.assertNotEqual(header.split('tpl;dur=')[1].split(',')[0], '0.0')
+
+    def test_unresolved(self):
+
+        with self.assertLogs('webapp.timing') as logs:
+            response = self.client.get('/no-such-page/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('view=- ', logs.output[0])
+
+    def test_header_private(self):
+
+        # Only logged for everyone else
+        with self.assertLogs('webapp.timing'):
+            response = self.client.get('/events/')
+        self.assertNotIn('Server-Timing', response)
+
+        with override_settings(DEBUG=True):
+            response = self.client.get('/events/')
+        self.assertIn('Server-Timing', response)
+
+    def test_log_off(self):
+
+        with override_settings(WEBAPP_TIMING_LOG=False):
+            with self.assertNoLogs('webapp.timing'):
+                response = self.client.get('/events/')
+        self.assertEqual(response.status_code, 200)
@@ -1,12 +1,15 @@
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 
 from webapp.models import Event, Volunteer
+from webapp.util import add_helper
 
 
 from datetime import datetime, date, timedelta
+from io import StringIO
 
 class FunctionTestCase(TestCase):
 
@@ -126,9 +129,98 @@ class FunctionTestCase(TestCase):
         volunteer1.withdrawn = timezone.now()
         volunteer1.save()
 
+        # The stored helper count was updated in the database, not on this instance
+        self.event.refresh_from_db(fields=['current_helper_count'])
         self.assertTrue(self.event.helpers_needed)
 
 
+    def test_event_current_helper_count(self):
+
+        self.assertEqual(self.event.current_helper_count, 0)
+
+        # Add two volunteers, via the M2M and directly
+        self.event.helpers.add(self.live1)
+        self.event.volunteer_set.create(person=self.live2)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_helper_count, 2)
+        self.assertEqual(self.event.n_helpers_available, 2)
+
+        # Withdraw one
+        volunteer1 = Volunteer.objects.get(event=self.event, person=self.live1)
+        volunteer1.withdrawn = timezone.now()
+        volunteer1.save()
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_helper_count, 1)
+
+        # Decline the other
+        volunteer2 = Volunteer.objects.get(event=self.event, person=self.live2)
+        volunteer2.declined = timezone.now()
+        volunteer2.save()
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_helper_count, 0)
+
+        # Volunteer for another event via the reverse M2M, and then delete
+        self.live1.events_volunteered.add(self.event3)
+        self.event3.refresh_from_db()
+        self.assertEqual(self.event3.current_helper_count, 1)
+
+        Volunteer.objects.filter(event=self.event3, person=self.live1).delete()
+        self.event3.refresh_from_db()
+        self.assertEqual(self.event3.current_helper_count, 0)
+
+
+    def test_repair_helper_counts(self):
+
+        self.event.helpers.add(self.live1)
+        self.event2.helpers.add(self.live1)
+        self.event2.helpers.add(self.live2)
+
+        # Break the stored counts behind the model's back
+        Event.objects.update(current_helper_count=5)
+
+        call_command('repair_helper_counts', stdout=StringIO())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_helper_count, 5)
+
+        call_command('repair_helper_counts', '--really', stdout=StringIO())
+        self.event.refresh_from_db()
+        self.event2.refresh_from_db()
+        self.event3.refresh_from_db()
+        self.assertEqual(self.event.current_helper_count, 1)
+        self.assertEqual(self.event2.current_helper_count, 2)
+        self.assertEqual(self.event3.current_helper_count, 0)
+
+
+    def test_stale_save(self):
+
+        self.event3.start = timezone.now() + timedelta(days=1)
+        self.event3.end = timezone.now() + timedelta(days=1, hours=1)
+        self.event3.helpers_required = 1
+        self.event3.save()
+
+        # Loaded before anyone volunteers, and edited and cancelled after
+        stale = Event.objects.get(pk=self.event3.pk)
+        self.assertIsNone(add_helper(self.event3, self.live1))
+        stale.notes = 'Plain Bob'
+        stale.save()
+        self.event3.refresh_from_db()
+        self.assertEqual(self.event3.current_helper_count, 1)
+        self.assertEqual(self.event3.notes, 'Plain Bob')
+
+        # So the one place stays taken
+        self.assertIsNotNone(add_helper(self.event3, self.live2))
+        self.assertEqual(Volunteer.objects.current().filter(event=self.event3).count(), 1)
+
+        stale.cancelled = timezone.now()
+        stale.save()
+        self.event3.refresh_from_db()
+        self.assertEqual(self.event3.current_helper_count, 1)
+        self.assertIsNotNone(self.event3.cancelled)
+
+
     def test_event_current_helpers(self):
 
         self.assertFalse(self.event.has_current_helper(self.live1))
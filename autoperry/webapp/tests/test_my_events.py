@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.models import Event, Volunteer
+from webapp.my_events import my_events
+
+from datetime import timedelta
+
+
+class MyEventsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.live = user_model.objects.create_user(
+            email='live@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Live',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.events = []
+        for i in range(3):
+            cls.events.append(Event.objects.create(
+                start=timezone.now() + timedelta(days=i+1),
+                end=timezone.now() + timedelta(days=i+1, hours=1),
+                location='Little Shelford',
+                helpers_required=2,
+                owner=cls.owner))
+
+    def setUp(self):
+
+        cache.clear()
+
+    def test_my_events(self):
+
+        self.events[0].helpers.add(self.live)
+
+        # Past events aren't kept
+        past = Event.objects.create(
+            start=timezone.now() - timedelta(days=7),
+            end=timezone.now() - timedelta(days=7, hours=-1),
+            location='Newton',
+            helpers_required=2,
+            owner=self.owner)
+        past.helpers.add(self.live)
+
+        self.assertEqual(my_events(self.owner)['helping'], [])
+        self.assertEqual(my_events(self.live), { 'helping': [self.events[0].pk] })
+
+        with self.assertNumQueries(0):
+            my_events(self.live)
+
+    def test_invalidation(self):
+
+        self.assertEqual(my_events(self.live)['helping'], [])
+
+        # Through the m2m manager, from either end
+        self.events[0].helpers.add(self.live)
+        self.assertEqual(my_events(self.live)['helping'], [self.events[0].pk])
+        self.live.events_volunteered.add(self.events[1])
+        self.assertEqual(sorted(my_events(self.live)['helping']), [self.events[0].pk, self.events[1].pk])
+
+        # Withdrawing
+        volunteer = Volunteer.objects.get(event=self.events[0], person=self.live)
+        volunteer.withdrawn = timezone.now()
+        volunteer.save()
+        self.assertEqual(my_events(self.live)['helping'], [self.events[1].pk])
+
+        # Clearing an event's helpers
+        self.events[1].helpers.clear()
+        self.assertEqual(my_events(self.live)['helping'], [])
+
+    def test_events_mine(self):
+
+        self.events[1].helpers.add(self.live)
+        self.client.force_login(self.live)
+
+        response = self.client.get('/events/', { 'f': 1, 'mine': 'yes' })
+        self.assertEqual(list(response.context['events_as_voluteer']), [self.events[1]])
+        self.assertEqual(list(response.context['events_as_organiser']), [])
+
+        # Once cached, the user's volunteering isn't looked up again
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/events/', { 'f': 1, 'mine': 'yes', 'page': 2 })
+        self.assertFalse([q for q in context.captured_queries if 'webapp_volunteer' in q['sql']])
+
+    def test_events_mine_past(self):
+
+        past = Event.objects.create(
+            start=timezone.now() - timedelta(days=7),
+            end=timezone.now() - timedelta(days=7, hours=-1),
+            location='Newton',
+            helpers_required=2,
+            owner=self.live)
+        past.helpers.add(self.live)
+        self.events[1].helpers.add(self.live)
+        self.client.force_login(self.live)
+
+        response = self.client.get('/events/', { 'f': 1, 'mine': 'yes' })
+        self.assertEqual(list(response.context['events_as_voluteer']), [self.events[1]])
+        self.assertEqual(list(response.context['events_as_organiser']), [])
+
+        response = self.client.get('/events/', { 'f': 1, 'mine': 'yes', 'past': 'yes' })
+        self.assertEqual(list(response.context['events_as_voluteer']), [past, self.events[1]])
+        self.assertEqual(list(response.context['events_as_organiser']), [past])
@@ -0,0 +1,180 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from webapp.management.commands.process_outbox import BACKOFF, MAX_ATTEMPTS
+from webapp.models import Event, OutboxMessage
+from webapp.util import queue_template_emails
+
+from datetime import timedelta
+from io import StringIO
+
+import smtplib
+
+
+class FailingEmailBackend(locmem.EmailBackend):
+
+    """
+    locmem backend that refuses every message
+    """
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPRecipientsRefused({})
+
+
+@override_settings(WEBAPP_EMAIL_OUTBOX=True)
+class OutboxTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1, minutes=30),
+            location='Little Shelford',
+            helpers_required=5,
+            owner=cls.owner,
+            alerts=True)
+
+        cls.helpers = []
+        for i in range(3):
+            helper = user_model.objects.create_user(
+                email=f'helper{i}@autoperry.com',
+                password='password',
+                first_name='Denise',
+                last_name=f'Helper {i}',
+                tower='Little Shelford',
+                email_validated=timezone.now(),
+                approved=timezone.now())
+            cls.helpers.append(helper)
+        cls.event.helpers.add(*cls.helpers[:2])
+
+    def process(self, *args):
+
+        call_command('process_outbox', *args, stdout=StringIO())
+
+    def test_event_cancel_queued(self):
+
+        self.client.force_login(self.owner)
+        response = self.client.post(f'/event/{self.event.pk}/cancel/', { 'confirm': 'Cancel' })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.filter(sent=None).count(), 2)
+
+        # Nothing sent without --really
+        self.process()
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.process('--really')
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['helper0@autoperry.com', 'helper1@autoperry.com'])
+        self.assertIn('cancel', mail.outbox[0].subject.lower())
+        self.assertEqual(OutboxMessage.objects.filter(sent=None).count(), 0)
+
+        # Sent messages aren't sent again
+        self.process('--really')
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_volunteer_queued(self):
+
+        self.client.force_login(self.helpers[2])
+        response = self.client.post(f'/event/{self.event.pk}/volunteer/', { 'confirm': 'Volunteer' })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.process('--really')
+        self.assertEqual([m.to for m in mail.outbox], [['owner@autoperry.com']])
+
+    def test_rollback(self):
+
+        # Nothing is queued if the transaction that queued it fails
+        try:
+            with transaction.atomic():
+                queue_template_emails([(self.helpers[0], 'email-email', {})])
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertEqual(OutboxMessage.objects.count(), 0)
+
+    def test_retry(self):
+
+        queue_template_emails([(self.helpers[0], 'email-email', {})])
+
+        with override_settings(EMAIL_BACKEND='webapp.tests.test_outbox.FailingEmailBackend'):
+            self.process('--really')
+
+        message = OutboxMessage.objects.get()
+        self.assertIsNone(message.sent)
+        self.assertEqual(message.attempts, 1)
+        self.assertNotEqual(message.last_error, '')
+        self.assertGreater(message.next_attempt, timezone.now() + BACKOFF - timedelta(minutes=1))
+
+        # Not retried until the backoff has passed
+        self.process('--really')
+        self.assertEqual(len(mail.outbox), 0)
+
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.process('--really')
+        self.assertEqual(len(mail.outbox), 1)
+        message.refresh_from_db()
+        self.assertIsNotNone(message.sent)
+
+    def test_bad_message(self):
+
+        # A message that can't be sent for reasons other than the mail
+        # server fails by itself without holding up the rest
+        queue_template_emails([(self.helpers[0], 'email-email', {})])
+        bad = OutboxMessage.objects.create(recipients=['helper1@autoperry.com'], subject='Ringing at\nNewton', body='')
+        queue_template_emails([(self.helpers[2], 'email-email', {})])
+
+        with self.assertLogs('webapp', level='WARNING'):
+            self.process('--really')
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['helper0@autoperry.com', 'helper2@autoperry.com'])
+        self.assertEqual(OutboxMessage.objects.filter(sent=None).get(), bad)
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn('newline', bad.last_error)
+
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.process('--really')
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_give_up(self):
+
+        queue_template_emails([(self.helpers[0], 'email-email', {})])
+        OutboxMessage.objects.update(attempts=MAX_ATTEMPTS - 1)
+
+        with override_settings(EMAIL_BACKEND='webapp.tests.test_outbox.FailingEmailBackend'):
+            with self.assertLogs('webapp', level='ERROR'):
+                self.process('--really')
+
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.process('--really')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.get().attempts, MAX_ATTEMPTS)
+
+    @override_settings(WEBAPP_EMAIL_OUTBOX=False)
+    def test_outbox_disabled(self):
+
+        queue_template_emails([(self.helpers[0], 'email-email', {})])
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 0)
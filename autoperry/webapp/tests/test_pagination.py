@@ -0,0 +1,145 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.models import Event
+
+from datetime import timedelta
+
+
+@override_settings(WEBAPP_KEYSET_PAGINATION=True)
+class KeysetPaginationTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        admin_group = Group.objects.create(name='webapp.administrators')
+        admin_group.permissions.add(Permission.objects.get(codename='administrator'))
+        cls.admin = user_model.objects.create_user(
+            email='admin@autoperry.com',
+            password='password',
+            first_name='Fiona',
+            last_name='Administrator',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+        cls.admin.groups.add(admin_group)
+
+        # Several users with the same name, to check ties are broken
+        for i in range(44):
+            user_model.objects.create_user(
+                email=f'user{i}@autoperry.com',
+                password=None,
+                first_name='Denise' if i % 3 else 'Alan',
+                last_name=f'Helper {i % 7}',
+                tower='Little Shelford',
+                email_validated=timezone.now(),
+                approved=timezone.now())
+
+        # Pairs of events at the same time, so location and id matter
+        start = timezone.now() + timedelta(days=1)
+        for i in range(45):
+            Event.objects.create(
+                start=start + timedelta(days=i // 2),
+                end=start + timedelta(days=i // 2, hours=1),
+                location=['Whittlesford', 'little Shelford', 'Newton'][i % 3],
+                helpers_required=2,
+                owner=cls.admin)
+
+    def setUp(self):
+
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def walk(self, url, key, first):
+
+        """
+        Follow 'Next' from the first page to the last, then 'Previous'
+        back again, returning the primary keys seen each way
+        """
+
+        response = self.client.get(url, first)
+        pages = [response.context[key]]
+        while pages[-1].has_next:
+            response = self.client.get(url, { 'after': pages[-1].next_cursor })
+            pages.append(response.context[key])
+
+        forward = [obj.pk for page in pages for obj in page]
+
+        backward_pages = [pages[-1]]
+        while backward_pages[-1].has_previous:
+            response = self.client.get(url, { 'before': backward_pages[-1].previous_cursor })
+            backward_pages.append(response.context[key])
+        backward = [obj.pk for page in reversed(backward_pages) for obj in page]
+
+        return forward, backward
+
+    def test_events(self):
+
+        forward, backward = self.walk('/events/', 'events', { 'f': 1 })
+
+        expected = list(Event.objects.order_by('start', 'location', 'id').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_events_by_location(self):
+
+        forward, backward = self.walk('/events/', 'events', { 'f': 1, 'location': 'yes' })
+
+        expected = list(Event.objects.order_by(Lower('location'), 'start', 'id').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_account_list(self):
+
+        forward, backward = self.walk('/admin/account-list/', 'users', { 'f': 1, 'current': 'yes' })
+
+        expected = list(get_user_model().objects.order_by('last_name', 'first_name', 'id').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_page_contents(self):
+
+        response = self.client.get('/events/', { 'f': 1 })
+        self.assertEqual(len(response.context['events']), 20)
+        self.assertContains(response, '45 events')
+        self.assertContains(response, '?after=')
+        self.assertNotContains(response, '?page=')
+
+    def test_bad_cursor(self):
+
+        for cursor in ('rubbish', 'WyJ4Il0=', ''):
+            with self.subTest(cursor):
+                response = self.client.get('/events/', { 'f': 1, 'after': cursor })
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['events'].has_previous)
+
+    def test_no_offset(self):
+
+        response = self.client.get('/events/', { 'f': 1 })
+        cursor = response.context['events'].next_cursor
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/events/', { 'after': cursor })
+        self.assertFalse([q for q in context.captured_queries if 'OFFSET' in q['sql']])
+
+    def test_cached_count(self):
+
+        # The default listing filters on the time of the request, but
+        # the total is still cached
+        self.client.get('/events/', { 'f': 1, 'cancelled': 'yes' })
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/events/', { 'f': 1, 'cancelled': 'yes' })
+        self.assertFalse([q for q in context.captured_queries if 'COUNT(' in q['sql'].upper()])
+        self.assertContains(response, '45 events')
+
+        # Different flags are counted separately
+        Event.objects.filter(pk=Event.objects.first().pk).update(cancelled=timezone.now())
+        response = self.client.get('/events/', { 'f': 1 })
+        self.assertContains(response, '44 events')
@@ -0,0 +1,235 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.models import Event
+
+from datetime import timedelta
+
+
+"""
+Test that the number of queries needed to render pages doesn't grow
+with the number of rows displayed
+"""
+
+class QueryCountTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.live = user_model.objects.create_user(
+            email='live@autoperry.com',
+            password='password',
+            first_name='Denise',
+            last_name='Live',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now(),
+            uuid='live-uuid')
+
+    def setUp(self):
+
+        self.client.force_login(self.live)
+        self.n_events = 0
+        cache.clear()
+
+    def add_events(self, n):
+
+        """
+        Add n future events needing helpers, volunteering for every
+        other one
+        """
+
+        for i in range(n):
+            start = timezone.now() + timedelta(days=1+self.n_events, hours=1)
+            event = Event.objects.create(
+                start=start,
+                end=start + timedelta(hours=1),
+                location='Little Shelford',
+                helpers_required=2,
+                owner=self.owner,
+                contact_address=None,
+                notes='Ab C#',
+                alerts=True)
+            if self.n_events % 2:
+                event.helpers.add(self.live)
+            self.n_events += 1
+
+    def count_queries(self, url):
+
+        # Make sure nothing comes from cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, small, large):
+
+        self.add_events(small)
+        few = self.count_queries(url)
+        self.add_events(large - small)
+        many = self.count_queries(url)
+        self.assertEqual(few, many)
+
+    def test_index(self):
+
+        self.assertConstantQueries('/?days=56', 2, 40)
+
+    def test_events(self):
+
+        self.assertConstantQueries('/events/?f=1&past=yes&cancelled=yes', 2, 20)
+
+    def test_events_mine(self):
+
+        self.assertConstantQueries('/events/?f=1&mine=yes', 2, 20)
+
+    def test_ical_future(self):
+
+        self.assertConstantQueries('/ical/future/live-uuid/', 2, 200)
+
+    def test_ical_future_content(self):
+
+        self.add_events(4)
+        response = self.client.get('/ical/future/live-uuid/')
+        # Only the events not already being helped with
+        self.assertEqual(response.content.count(b'BEGIN:VEVENT'), 2)
+
+
+class EventPageQueryTestCase(TestCase):
+
+    """
+    Test that the event pages load the event, its owner and helpers in
+    a fixed number of queries, however many helpers there are
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+        cls.user_model = user_model
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            phone_number='01223 123456',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.visitor = user_model.objects.create_user(
+            email='visitor@autoperry.com',
+            password='password',
+            first_name='Brenda',
+            last_name='Visitor',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1),
+            location='Little Shelford',
+            helpers_required=50,
+            owner=cls.owner)
+
+    def setUp(self):
+
+        self.helpers = []
+
+    def add_helpers(self, n):
+
+        for i in range(len(self.helpers), len(self.helpers) + n):
+            helper = self.user_model.objects.create_user(
+                email=f'helper{i}@autoperry.com',
+                password=None,
+                first_name='Denise',
+                last_name=f'Helper {i}',
+                tower='Little Shelford',
+                email_validated=timezone.now(),
+                approved=timezone.now())
+            self.event.helpers.add(helper)
+            self.helpers.append(helper)
+
+    def count_queries(self, user, url):
+
+        self.client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_event_pages(self):
+
+        pk = self.event.pk
+        pages = [('owner details', 'owner', f'/event/{pk}/'),
+                 ('helper details', 'helper', f'/event/{pk}/'),
+                 ('visitor details', 'visitor', f'/event/{pk}/'),
+                 ('edit', 'owner', f'/event/{pk}/edit/'),
+                 ('cancel', 'owner', f'/event/{pk}/cancel/'),
+                 ('volunteer', 'visitor', f'/event/{pk}/volunteer/'),
+                 ('unvolunteer', 'helper', f'/event/{pk}/unvolunteer/'),
+                 ('decline', 'owner', f'/event/{pk}/decline/helper/')]
+
+        def counts():
+            users = {'owner': self.owner, 'helper': self.helpers[0], 'visitor': self.visitor}
+            return {name: self.count_queries(users[user], url.replace('helper/', f'{self.helpers[0].pk}/'))
+                    for name, user, url in pages}
+
+        self.add_helpers(2)
+        few = counts()
+        self.add_helpers(10)
+        self.assertEqual(counts(), few)
+
+    def test_prefetched_helpers(self):
+
+        self.add_helpers(3)
+        event = Event.objects.with_helpers().get(pk=self.event.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(event.current_helpers, self.helpers)
+            self.assertTrue(event.has_current_helper(self.helpers[1]))
+            self.assertFalse(event.has_current_helper(self.visitor))
+            self.assertEqual(event.current_volunteer(self.helpers[2]).person, self.helpers[2])
+            self.assertIn('01223 123456', event.contact_info)
+
+        # Changes made through the prefetched records show up
+        volunteer = event.current_volunteer(self.helpers[1])
+        volunteer.withdrawn = timezone.now()
+        volunteer.save()
+        self.assertEqual(event.current_helpers, [self.helpers[0], self.helpers[2]])
+        self.assertFalse(event.has_current_helper(self.helpers[1]))
+        self.assertEqual(event.current_helper_count, 2)
+
+    def test_unvolunteer_email(self):
+
+        self.add_helpers(3)
+        self.event.alerts = True
+        self.event.save()
+
+        self.client.force_login(self.helpers[1])
+        self.client.post(f'/event/{self.event.pk}/unvolunteer/', { 'confirm': 'Confirm' })
+
+        # The owner is told about the remaining helpers only
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('* Denise Helper 0', mail.outbox[0].body)
+        self.assertNotIn('* Denise Helper 1', mail.outbox[0].body)
+        self.assertIn('* Denise Helper 2', mail.outbox[0].body)
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import Rank
+from django.test import TestCase
+from django.utils import timezone
+
+from webapp.models import Event, Volunteer
+from webapp.ranking import helper_rank, helper_ranking
+
+from datetime import datetime, timedelta
+from unittest import mock
+
+
+class RankingTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.users = []
+        for i in range(6):
+            cls.users.append(user_model.objects.create_user(
+                email=f'user{i}@autoperry.com',
+                password='password',
+                first_name='Denise',
+                last_name=f'User {i}',
+                tower='Little Shelford',
+                email_validated=timezone.now(),
+                approved=timezone.now()))
+
+        base = datetime(1960, 3, 5, hour=14, minute=0)
+        cls.events = []
+        for i in range(4):
+            cls.events.append(Event.objects.create(
+                start=base + timedelta(days=i),
+                end=base + timedelta(days=i, hours=1),
+                location='Little Shelford',
+                helpers_required=6,
+                owner=cls.users[0]))
+
+        # user0: 3, user1: 2, user2: 2, user3: 1 (+ 1 withdrawn),
+        # user4: 0 (1 declined), user5: nothing
+        for event in cls.events[:3]:
+            event.helpers.add(cls.users[0])
+        for event in cls.events[:2]:
+            event.helpers.add(cls.users[1], cls.users[2])
+        cls.events[0].helpers.add(cls.users[3])
+        Volunteer.objects.create(event=cls.events[1], person=cls.users[3], withdrawn=timezone.now())
+        Volunteer.objects.create(event=cls.events[1], person=cls.users[4], declined=timezone.now())
+
+    def setUp(self):
+
+        cache.clear()
+
+    def window_ranking(self):
+
+        """
+        The ranking as previously computed with a window over all users
+        """
+
+        return {u.pk: (u.num_helped, u.rank) for u in (get_user_model().objects.all()
+            .annotate(num_helped=Count('volunteer__id', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None)), distinct=True))
+            .annotate(rank=Window(expression=Rank(), order_by=F('num_helped').desc())))}
+
+    def test_matches_window(self):
+
+        expected = self.window_ranking()
+        for user in self.users:
+            with self.subTest(user):
+                self.assertEqual(helper_rank(user), expected[user.pk])
+
+        self.assertEqual(helper_rank(self.users[0]), (3, 1))
+        self.assertEqual(helper_rank(self.users[1]), (2, 2))
+        self.assertEqual(helper_rank(self.users[2]), (2, 2))
+        self.assertEqual(helper_rank(self.users[3]), (1, 4))
+        self.assertEqual(helper_rank(self.users[4]), (0, 5))
+        self.assertEqual(helper_rank(self.users[5]), (0, 5))
+
+    def test_cached(self):
+
+        helper_ranking()
+        with self.assertNumQueries(0):
+            helper_rank(self.users[0])
+
+    def test_one_lookup(self):
+
+        # Once built, a user's rank only needs the generation from the cache
+        helper_ranking()
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            helper_rank(self.users[0])
+        get.assert_called_once_with('webapp.generation.helper_ranking')
+
+    def test_invalidated(self):
+
+        self.assertEqual(helper_rank(self.users[5]), (0, 5))
+
+        self.events[3].volunteer_set.create(person=self.users[5])
+        self.events[2].helpers.add(self.users[5])
+        self.assertEqual(helper_rank(self.users[5]), (2, 2))
+
+        volunteer = Volunteer.objects.get(event=self.events[3], person=self.users[5])
+        volunteer.withdrawn = timezone.now()
+        volunteer.save()
+        self.assertEqual(helper_rank(self.users[5]), (1, 4))
+
+        for user in self.users:
+            with self.subTest(user):
+                self.assertEqual(helper_rank(user), self.window_ranking()[user.pk])
@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from webapp.models import Event
+
+from datetime import timedelta
+from io import StringIO
+
+
+class HelperReminderTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+        cls.user_model = user_model
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        # Next week's Wednesday evening, and the one after
+        now = timezone.now()
+        last_monday = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=now.weekday())
+        cls.next_week = last_monday + timedelta(days=9, hours=19)
+        cls.cutoff = last_monday + timedelta(days=14)
+
+        cls.events = []
+        for i in range(3):
+            cls.events.append(Event.objects.create(
+                start=cls.next_week + timedelta(hours=i),
+                end=cls.next_week + timedelta(hours=i, minutes=30),
+                location=f'Tower {i}',
+                helpers_required=20,
+                owner=cls.owner))
+
+        cls.week_after = Event.objects.create(
+            start=cls.next_week + timedelta(days=7),
+            end=cls.next_week + timedelta(days=7, hours=1),
+            location='Little Shelford',
+            helpers_required=20,
+            owner=cls.owner)
+
+        cls.cancelled = Event.objects.create(
+            start=cls.next_week,
+            end=cls.next_week + timedelta(hours=1),
+            location='Whittlesford',
+            helpers_required=20,
+            owner=cls.owner,
+            cancelled=now)
+
+    def add_helper(self, n, events, send_notifications=True):
+
+        user = self.user_model.objects.create_user(
+            email=f'helper{n}@autoperry.com',
+            password=None,
+            first_name='Denise',
+            last_name=f'Helper {n}',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now(),
+            send_notifications=send_notifications)
+        for event in events:
+            event.helpers.add(user)
+        return user
+
+    def remind(self):
+
+        with CaptureQueriesContext(connection) as context:
+            call_command('send_helper_reminders', '--really', stdout=StringIO())
+        return len(context.captured_queries)
+
+    def test_reminders(self):
+
+        both = self.add_helper(1, self.events[:2] + [self.week_after, self.cancelled])
+        one = self.add_helper(2, self.events[2:])
+        quiet = self.add_helper(3, self.events, send_notifications=False)
+        none = self.add_helper(4, [self.week_after])
+
+        self.remind()
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['helper1@autoperry.com', 'helper2@autoperry.com'])
+        message = [m for m in mail.outbox if m.to[0] == 'helper1@autoperry.com'][0]
+        self.assertIn('Tower 0', message.body)
+        self.assertIn('Tower 1', message.body)
+        self.assertNotIn('Tower 2', message.body)
+        self.assertNotIn('Whittlesford', message.body)
+
+        for user, reminded in ((both, True), (one, True), (quiet, False), (none, False)):
+            with self.subTest(user):
+                user.refresh_from_db()
+                self.assertEqual(user.reminded_upto, self.cutoff if reminded else None)
+
+    def test_query_count(self):
+
+        for n in range(2):
+            self.add_helper(n, self.events)
+        few = self.remind()
+
+        for n in range(2, 12):
+            self.add_helper(n, self.events)
+        many = self.remind()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(mail.outbox), 14)
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from webapp.caching import generation, EVENT
+from webapp.models import Event
+from webapp.util import series_clashes
+
+from datetime import timedelta
+
+
+class SeriesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.anchor = (timezone.now() + timedelta(days=1)).replace(hour=19, minute=30, second=0, microsecond=0)
+
+        # Clashes with the third week of the series
+        cls.clash = Event.objects.create(
+            start=cls.anchor + timedelta(weeks=2, minutes=30),
+            end=cls.anchor + timedelta(weeks=2, hours=2),
+            location='Whittlesford',
+            helpers_required=2,
+            owner=cls.owner)
+
+        # Elsewhere, or cancelled, so not clashes
+        Event.objects.create(
+            start=cls.anchor + timedelta(weeks=1),
+            end=cls.anchor + timedelta(weeks=1, hours=2),
+            location='Stapleford',
+            helpers_required=2,
+            owner=cls.owner)
+        Event.objects.create(
+            start=cls.anchor + timedelta(weeks=3),
+            end=cls.anchor + timedelta(weeks=3, hours=2),
+            location='Whittlesford',
+            helpers_required=2,
+            owner=cls.owner,
+            cancelled=timezone.now())
+
+    def setUp(self):
+
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def post(self, weeks, location='Whittlesford'):
+
+        return self.client.post('/event/create/',
+            { 'date': self.anchor.date(),
+              'start_time': self.anchor.time(),
+              'end_time': (self.anchor + timedelta(hours=1, minutes=30)).time(),
+              'weeks': weeks,
+              'location': location,
+              'helpers_required': 3,
+              'contact_address': '',
+              'notes': 'Term',
+              'alerts': 'yes',
+            }, follow=True)
+
+    def test_series_clashes(self):
+
+        occurrences = [(self.anchor + timedelta(weeks=week),
+                        self.anchor + timedelta(weeks=week, hours=1, minutes=30)) for week in range(10)]
+
+        with self.assertNumQueries(1):
+            clashes = series_clashes(occurrences, 'Whittlesford')
+
+        self.assertEqual(clashes, [(*occurrences[2], [self.clash])])
+        self.assertEqual(series_clashes(occurrences, 'Newton'), [])
+
+    def test_create_series(self):
+
+        before = generation(EVENT)
+        response = self.post(4)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'webapp/events.html')
+        self.assertContains(response, '3 events successfully created')
+        self.assertContains(response, 'overlap with existing events')
+
+        created = Event.objects.filter(notes='Term').order_by('start')
+        self.assertEqual([e.start for e in created],
+                         [self.anchor + timedelta(weeks=week) for week in (0, 1, 3)])
+        self.assertTrue(all(e.owner == self.owner and e.helpers_required == 3 and e.alerts for e in created))
+
+        # Cached calendars were invalidated even though no signals were sent
+        self.assertNotEqual(generation(EVENT), before)
+
+    def test_create_series_all_clash(self):
+
+        self.post(2, location='Newton')
+        response = self.post(2, location='Newton')
+
+        self.assertTemplateUsed(response, 'webapp/event-create.html')
+        self.assertContains(response, 'These dates would overlap with existing events')
+        self.assertEqual(Event.objects.filter(location='Newton').count(), 2)
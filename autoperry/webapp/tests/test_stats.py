@@ -2,13 +2,16 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
 from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 
-from webapp.models import Event
-from webapp.util import build_stats_screen
+from webapp.models import Event, MonthSummary
+from webapp.util import build_stats_screen, build_month_summary
 
 from datetime import datetime, timedelta
+from io import StringIO
 
 
 
@@ -147,6 +150,10 @@ class PermissionsTestCase(TestCase):
 
         cls.now = now
 
+    def setUp(self):
+
+        cache.clear()
+
 
     def test_overall(self):
 
@@ -205,3 +212,59 @@ class PermissionsTestCase(TestCase):
              'helpers_declined': 4,
             })
 
+
+    def test_rollup_matches_live(self):
+
+        # First call materialises the completed months...
+        self.assertEqual(MonthSummary.objects.count(), 0)
+        first = build_stats_screen(self.now)
+        self.assertEqual(MonthSummary.objects.count(), 1)
+
+        # ... which the second one reads back, with the distinct totals
+        # over all history from the cache
+        with self.assertNumQueries(5):
+            second = build_stats_screen(self.now)
+        self.assertEqual(first, second)
+
+        live = build_month_summary(None, self.now)
+        self.assertEqual([{k: v for k, v in month.items() if k != 'incomplete'}
+                          for month in second['month_summary']], live)
+
+        # Totals agree with a live aggregation over all history
+        self.assertEqual(second['event_totals']['events'], sum(m['events'] for m in live))
+        self.assertEqual(second['helper_totals']['helpers_provided'], sum(m['helpers_provided'] for m in live))
+
+
+    def test_distinct_totals_invalidated(self):
+
+        build_stats_screen(self.now)
+
+        # A new location and helper show up despite the cached totals
+        event = Event.objects.create(
+            start=self.event4.start + timedelta(hours=2),
+            end=self.event4.start + timedelta(hours=3),
+            location='Whittlesford',
+            helpers_required=1,
+            owner=self.user2)
+        event.volunteer_set.create(person=self.user3)
+
+        data = build_stats_screen(self.now)
+        self.assertEqual(data['event_totals']['locations'], 2)
+        self.assertEqual(data['helper_totals']['distinct_helpers'], 3)
+
+
+    def test_rollup_rebuild(self):
+
+        build_stats_screen(self.now)
+
+        # Completed months aren't recomputed...
+        self.event2.helpers_required = 5
+        self.event2.save()
+        data = build_stats_screen(self.now)
+        self.assertEqual(data['month_summary'][0]['helpers_wanted'], 3)
+
+        # ... until they are explicitly rebuilt
+        call_command('rebuild_stats', '--really', stdout=StringIO())
+        data = build_stats_screen(self.now)
+        self.assertEqual(data['month_summary'][0]['helpers_wanted'], 7)
+        self.assertEqual(data['event_totals']['helpers_wanted'], 8)
@@ -0,0 +1,175 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from webapp.caching import generation, VOLUNTEER
+from webapp.models import Event, Volunteer
+from webapp.util import add_helper
+
+from datetime import timedelta
+from unittest import mock
+
+import threading
+import unittest
+
+
+class ConcurrentVolunteerTestCase(TransactionTestCase):
+
+    """
+    Fire volunteer POSTs from several threads at once, each with its
+    own database connection, and check that no event gets more helpers
+    than it asked for. On SQLite this needs a file test database, so
+    run with --settings autoperry.concurrency_settings
+    """
+
+    THREADS = 8
+
+    @classmethod
+    def setUpClass(cls):
+
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise unittest.SkipTest('Needs a file test database, see autoperry.concurrency_settings')
+        super().setUpClass()
+
+    def setUp(self):
+
+        cache.clear()
+        user_model = get_user_model()
+
+        self.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        self.helpers = [user_model.objects.create_user(
+            email=f'helper{i}@autoperry.com',
+            password=None,
+            first_name='Denise',
+            last_name=f'Helper {i}',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now()) for i in range(self.THREADS)]
+
+        self.events = [Event.objects.create(
+            start=timezone.now() + timedelta(days=1, hours=i*2),
+            end=timezone.now() + timedelta(days=1, hours=i*2+1),
+            location=f'Tower {i}',
+            helpers_required=required,
+            owner=self.owner) for i, required in enumerate((1, 3))]
+
+    def stampede(self, posts):
+
+        """
+        POST to volunteer for each (helper, event) in posts, all
+        released at the same moment, returning the status codes
+        """
+
+        barrier = threading.Barrier(len(posts))
+        statuses = []
+        errors = []
+
+        def post(helper, event):
+            try:
+                client = Client()
+                client.force_login(helper)
+                barrier.wait()
+                response = client.post(f'/event/{event.pk}/volunteer/', { 'confirm': 'Confirm' })
+                statuses.append(response.status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=args) for args in posts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return statuses
+
+    def assertNotOverfilled(self):
+
+        for event in Event.objects.all():
+            with self.subTest(event=event.location):
+                current = Volunteer.objects.current().filter(event=event).count()
+                self.assertLessEqual(current, event.helpers_required)
+                self.assertEqual(event.current_helper_count, current)
+
+    def test_concurrent_volunteers(self):
+
+        for event in self.events:
+            statuses = self.stampede([(helper, event) for helper in self.helpers])
+            self.assertEqual(statuses, [302] * self.THREADS)
+
+        self.assertNotOverfilled()
+        for event in self.events:
+            self.assertEqual(Volunteer.objects.filter(event=event).count(), event.helpers_required)
+
+    def test_double_click(self):
+
+        # The same person volunteering several times at once
+        helper = self.helpers[0]
+        self.stampede([(helper, self.events[1])] * 4)
+
+        self.assertNotOverfilled()
+        self.assertEqual(Volunteer.objects.filter(event=self.events[1], person=helper).count(), 1)
+
+
+class AddHelperCacheTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        user_model = get_user_model()
+
+        cls.owner = user_model.objects.create_user(
+            email='owner@autoperry.com',
+            password='password',
+            first_name='Geoff',
+            last_name='Owner',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.helper = user_model.objects.create_user(
+            email='helper@autoperry.com',
+            password=None,
+            first_name='Denise',
+            last_name='Helper',
+            tower='Little Shelford',
+            email_validated=timezone.now(),
+            approved=timezone.now())
+
+        cls.event = Event.objects.create(
+            start=timezone.now() + timedelta(days=1),
+            end=timezone.now() + timedelta(days=1, hours=1),
+            location='Little Shelford',
+            helpers_required=1,
+            owner=cls.owner)
+
+    def test_invalidated_on_commit(self):
+
+        # Nothing is written to the cache while the event is locked...
+        before = generation(VOLUNTEER)
+        with mock.patch.object(cache, 'set', wraps=cache.set) as set_, \
+             mock.patch.object(cache, 'delete_many', wraps=cache.delete_many) as delete_many:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertIsNone(add_helper(self.event, self.helper))
+            set_.assert_not_called()
+            delete_many.assert_not_called()
+        self.assertEqual(generation(VOLUNTEER), before)
+
+        # ...only once the transaction commits
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(generation(VOLUNTEER), before)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_helper_count, 1)
@@ -32,6 +32,7 @@ urlpatterns = [
     path(r"event/<int:event_id>/unvolunteer/", views.unvolunteer, name="unvolunteer"),
     path(r"event/<int:event_id>/decline/<int:helper_id>/", views.decline, name="decline"),
     path(r"events-csv/", views.events_csv, name="events-csv"),
+    path(r"api/locations/", views.api_locations, name="api-locations"),
     path(r"admin/send-emails/", views.send_emails, name="send-emails"),
     path(r"admin/account-list/", views.account_list, name="account-list"),
     path(r"admin/account-list-csv/", views.account_list_csv, name="account-list-csv"),
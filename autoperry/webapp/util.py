@@ -1,29 +1,46 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.contrib.sites.shortcuts import get_current_site
-from django.db.models import Q, Count, Sum
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import transaction
+from django.db.models import F, Q, Count, Sum
 from django.db.models.functions import TruncMonth
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import http_date
 
 from custom_user.models import User
-from .models import Event
+from .caching import cached, on_commit_only, versioned_key, EVENT, VOLUNTEER
+from .models import Event, MonthSummary, OutboxMessage, Volunteer
+from .my_events import my_events
 
+from datetime import timedelta
+
+from itertools import chain
+
+import base64
 import csv
+import hashlib
+import json
+import smtplib
+import time
 
 import logging
 logger = logging.getLogger(__name__)
 
-def send_template_email(to,template,context,force=False):
+def template_email(to,template,context,force=False):
 
     """
-    Construct an email from the supplied template path and context
-    and send it to the user
+    Construct an email from the supplied template path and context,
+    addressed to the user or address `to`. Returns None if the user
+    shouldn't be emailed
     """
 
     local_context = context.copy()
@@ -40,23 +57,132 @@ def send_template_email(to,template,context,force=False):
 
         if to.cancelled or to.suspended:
             logger.warning(f'"{to}": not emailing "{subject}" - user cancelled or suspended')
-            return
+            return None
         if not to.email_validated and not force:
             logger.warning(f'"{to}": not emailing "{subject}" - email not yet validated')
-            return
+            return None
         if to.email_blocked and not force:
             logger.warning(f'"{to}": not emailing "{subject}" - email blocked')
-            return
+            return None
         if not to.send_notifications and not force:
             logger.warning(f'"{to}": not emailing "{subject}" - notifications not wanted')
-            return
-        to.email_user(subject, message)
-        logger.info(f'"{to}": ({to.email}) emailed "{subject}"')
+            return None
+        return EmailMessage(subject, message, None, [to.email])
+
+    else:
 
+        return EmailMessage(subject, message, None, [to])
+
+
+def log_sent_email(to, email):
+
+    if isinstance(to, User):
+        logger.info(f'"{to}": ({to.email}) emailed "{email.subject}"')
     else:
+        logger.info(f'Emailed address "{to}"" "{email.subject}"')
+
+
+def send_template_email(to,template,context,force=False):
+
+    """
+    Construct an email from the supplied template path and context
+    and send it to the user
+    """
+
+    email = template_email(to, template, context, force)
+    if email:
+        email.send()
+        log_sent_email(to, email)
+
+
+def template_emails(emails,force=False):
+
+    """
+    Construct emails from an iterable of (to, template, context),
+    returning a list of (to, email) for those that should be sent
+    """
+
+    batch = []
+    for to, template, context in emails:
+        email = template_email(to, template, context, force)
+        if email:
+            batch.append((to, email))
+    return batch
+
+
+def send_template_emails(emails,force=False):
 
-        send_mail(subject, message, None, [to])
-        logger.info(f'Emailed address "{to}"" "{subject}"')
+    """
+    Construct emails from an iterable of (to, template, context) and
+    send them over a single connection to the mail server. Messages
+    are sent one at a time so that a failure of any kind only loses
+    that one. Returns the entries from emails that couldn't be sent
+    """
+
+    batch = []
+    for entry in emails:
+        email = template_email(*entry, force)
+        if email:
+            batch.append((entry, email))
+
+    if not batch:
+        return []
+
+    sent = []
+    failed = []
+    try:
+        with get_connection() as connection:
+            for entry, email in batch:
+                try:
+                    connection.send_messages([email])
+                    sent.append(entry)
+                    log_sent_email(entry[0], email)
+                except Exception as e:
+                    logger.error(f'"{entry[0]}": failed to email "{email.subject}": {e}')
+                    failed.append(entry)
+    except (smtplib.SMTPException, OSError) as e:
+        # Couldn't connect - everything not already sent failed
+        logger.error(f'Failed to connect to the mail server: {e}')
+        failed = [entry for entry, email in batch if entry not in sent]
+    return failed
+
+
+def queue_template_email(to,template,context,force=False):
+
+    """
+    Construct an email from the supplied template path and context
+    and queue it for the user
+    """
+
+    queue_template_emails([(to, template, context)], force)
+
+
+def queue_template_emails(emails,force=False):
+
+    """
+    Construct emails from an iterable of (to, template, context) and,
+    if settings.WEBAPP_EMAIL_OUTBOX is set, add them to the outbox for
+    the process_outbox management command to deliver. The outbox rows
+    are written in the current transaction, so nothing is queued if it
+    rolls back and the worker can't see them until it commits.
+    Otherwise send them immediately.
+    """
+
+    if not getattr(settings, 'WEBAPP_EMAIL_OUTBOX', False):
+        send_template_emails(emails, force)
+        return
+
+    batch = template_emails(emails, force)
+
+    OutboxMessage.objects.bulk_create([
+        OutboxMessage(recipients=email.to, subject=email.subject, body=email.body)
+        for to, email in batch])
+
+    for to, email in batch:
+        if isinstance(to, User):
+            logger.info(f'"{to}": ({to.email}) queued email "{email.subject}"')
+        else:
+            logger.info(f'Queued email to address "{to}" "{email.subject}"')
 
 
 def autoperry_login_required(function=None, redirect_field_name=REDIRECT_FIELD_NAME, login_url=None):
@@ -98,12 +224,14 @@ def event_clash_error(start, end, location, this=None):
                 .filter(cancelled=None)
                 .filter(location=location)
                 .filter(start__lt=end)
-                .filter(end__gt=start))
+                .filter(end__gt=start)
+                .order_by('start'))
 
     if this:
         clashes = clashes.exclude(pk=this.pk)
 
-    if clashes.all():
+    # Rendering lists the clashes, but that's only needed if there are any
+    if clashes.exists():
         message = (render_to_string("webapp/event-clash-error-fragment.html",
             { "clashes": clashes, 'location': location }))
         return message
@@ -111,6 +239,40 @@ def event_clash_error(start, end, location, this=None):
     return None
 
 
+def series_clashes(occurrences, location):
+
+    """
+    Test a series of (start, end) occurrences at location against
+    existing events with a single query covering the whole series.
+    Return a list of (start, end, clashing events) for each
+    occurrence that would clash
+    """
+
+    existing = list(Event.objects.all()
+                .filter(cancelled=None)
+                .filter(location=location)
+                .filter(start__lt=max(end for start, end in occurrences))
+                .filter(end__gt=min(start for start, end in occurrences))
+                .order_by('start'))
+
+    result = []
+    for start, end in occurrences:
+        clashes = [event for event in existing if event.start < end and event.end > start]
+        if clashes:
+            result.append((start, end, clashes))
+    return result
+
+
+def series_clash_error(clashes, location):
+
+    """
+    Return an error message listing the clashes found by series_clashes
+    """
+
+    return render_to_string("webapp/series-clash-error-fragment.html",
+        { "clashes": clashes, 'location': location })
+
+
 def volunteer_clash_error(user, event):
 
     """
@@ -126,57 +288,84 @@ def volunteer_clash_error(user, event):
                .filter(volunteer__declined=None)
                .filter(volunteer__withdrawn=None)
                .filter(start__lt=event.end)
-               .filter(end__gt=event.start))
+               .filter(end__gt=event.start)
+               .order_by('start'))
 
-    if clashes.all():
+    if clashes.exists():
         message = render_to_string("webapp/volunteer-clash-error-fragment.html",
             { "clashes": clashes })
         return message
 
     return None
 
-def build_stats_screen(now):
+
+def add_helper(event, user):
 
     """
-    Collect aggregate statistics for the stats page
+    Add user as a helper at event, if it still needs helpers and they
+    aren't already one. Return an error message if not, else None.
+
+    A conditional UPDATE claims a place by incrementing the event's
+    current_helper_count, which also locks its row until the end of
+    this short transaction so that concurrent offers are checked one
+    at a time and can't overfill the event. The count is then
+    recomputed from the Volunteer records by the signal handler. Its
+    cache invalidation waits until the transaction commits, so that
+    the event stays locked for no longer than necessary
     """
 
-    people_totals = (get_user_model().objects.all()
-        .aggregate(
-            pending=Count('id', filter=(Q(approved=None) | Q(email_validated=None)) & Q(cancelled=None) & Q(suspended=None)),
-            live=Count('id', filter=(~Q(approved=None) & ~Q(email_validated=None)) & Q(cancelled=None) & Q(suspended=None)),
-            suspended=Count('id', filter=Q(cancelled=None) & ~Q(suspended=None)),
-            cancelled=Count('id', filter=(~Q(cancelled=None)))
-        )
-    )
+    with transaction.atomic(), on_commit_only():
 
-    event_totals = (Event.objects.all()
-        .filter(start__lte=now)
-        .aggregate(
-            events=Count('id', filter=Q(cancelled=None)),
-            cancelled_events=Count('id', filter=~Q(cancelled=None)),
-            owners=Count('owner', distinct=True, filter=Q(cancelled=None)),
-            locations=Count('location', distinct=True, filter=Q(cancelled=None)),
-            helpers_wanted=Sum('helpers_required', filter=Q(cancelled=None)),
-        )
-    )
+        claimed = (Event.objects
+            .filter(pk=event.pk, cancelled=None, start__gte=timezone.now())
+            .filter(current_helper_count__lt=F('helpers_required'))
+            .update(current_helper_count=F('current_helper_count') + 1))
+        if not claimed:
+            return "This event already has enough helpers so you can't also volunteer to help with it"
 
-    helper_totals = (Event.objects.all()
-        .filter(start__lte=now)
-        .aggregate(
-            helpers_provided=Count('volunteer__person', filter=(Q(cancelled=None) & Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))),
-            distinct_helpers=Count('volunteer__person', distinct=True, filter=(Q(cancelled=None) & Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))),
-            helpers_cancelled=Count('volunteer__person', filter=(~Q(cancelled=None) & Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))),
-            helpers_withdrawn=Count('volunteer__person', filter=~Q(volunteer__withdrawn=None)),
-            helpers_declined=Count('volunteer__person', filter=~Q(volunteer__declined=None)),
-        )
-    )
+        if Volunteer.objects.current().filter(event=event, person=user).exists():
+            transaction.set_rollback(True)
+            return 'You have already volunteered to help at this event'
 
-    events = (Event.objects.all()
-        .filter(start__lte=now)
-        .annotate(month=TruncMonth('start'))
-        .values('month')
-    )
+        event.volunteer_set.create(person=user)
+
+    return None
+
+
+def current_event_ids(user):
+
+    """
+    Return the set of ids of the future events for which user is a
+    current (so not withdrawn, not declined) helper, from the cached
+    my_events, so that event lists can test membership without a query
+    per row. Past events never need helpers so aren't included
+    """
+
+    if not user.is_authenticated:
+        return set()
+
+    return set(my_events(user)['helping'])
+
+
+MONTH_FIELDS = ('events', 'cancelled_events', 'owners', 'locations', 'helpers_wanted',
+                'helpers_provided', 'distinct_helpers', 'helpers_cancelled', 'helpers_withdrawn', 'helpers_declined')
+
+# Month fields that can be added up across months (the rest are distinct counts)
+SUMMABLE_FIELDS = ('events', 'cancelled_events', 'helpers_wanted',
+                   'helpers_provided', 'helpers_cancelled', 'helpers_withdrawn', 'helpers_declined')
+
+
+def build_month_summary(after, upto):
+
+    """
+    Compute per-month statistics live for events starting on or after
+    `after` (if not None) and on or before `upto`
+    """
+
+    events = Event.objects.all().filter(start__lte=upto)
+    if after:
+        events = events.filter(start__gte=after)
+    events = events.annotate(month=TruncMonth('start')).values('month')
 
     event_sum = (events
         .annotate(
@@ -202,13 +391,113 @@ def build_stats_screen(now):
         .order_by()
     )
 
-    # The two queries should return results for the same months in the
-    # same order so we can zip them together and return them. Probably...
+    # Merge the two on month, rather than trusting them to come back
+    # in the same order
+    helpers = {h['month']: h for h in helper_sum}
+    return [{**e, **helpers[e['month']]} for e in sorted(event_sum, key=lambda e: e['month'])]
+
+
+def materialise_month_summaries(month_start):
+
+    """
+    Store statistics for any completed months (those before
+    `month_start`) that haven't already been stored. Months are only
+    computed once, so the cost doesn't grow with history
+    """
+
+    last = MonthSummary.objects.filter(month__lt=month_start).order_by('-month').first()
+    after = (last.month + timedelta(days=32)).replace(day=1) if last else None
+
+    # Nothing to do if we already have last month
+    if after and after >= month_start:
+        return
+
+    months = build_month_summary(after, month_start - timedelta(microseconds=1))
+    MonthSummary.objects.bulk_create(
+        [MonthSummary(**month) for month in months],
+        ignore_conflicts=True)
+
+
+# Distinct totals over all history are cached until an event or
+# volunteering changes. Events also move into the past without
+# changing, so the totals can lag behind by up to this long
+STATS_TIMEOUT = 300
+
+
+def build_distinct_totals(now):
+
+    """
+    Count the distinct owners and locations of non-cancelled events
+    that have started by now, and the distinct people currently
+    helping at them. These can't be added up across months
+    """
+
+    distinct_events = (Event.objects.all()
+        .filter(start__lte=now)
+        .aggregate(
+            owners=Count('owner', distinct=True, filter=Q(cancelled=None)),
+            locations=Count('location', distinct=True, filter=Q(cancelled=None)),
+        )
+    )
+
+    distinct_helpers = (Volunteer.objects.current()
+        .filter(event__start__lte=now, event__cancelled=None)
+        .aggregate(distinct_helpers=Count('person', distinct=True))
+    )
+
+    return {**distinct_events, **distinct_helpers}
+
+
+def build_stats_screen(now):
+
+    """
+    Collect aggregate statistics for the stats page. Completed months
+    come from MonthSummary, only the current month is computed live,
+    and distinct totals over all history are cached
+    """
+
+    people_totals = (get_user_model().objects.all()
+        .aggregate(
+            pending=Count('id', filter=(Q(approved=None) | Q(email_validated=None)) & Q(cancelled=None) & Q(suspended=None)),
+            live=Count('id', filter=(~Q(approved=None) & ~Q(email_validated=None)) & Q(cancelled=None) & Q(suspended=None)),
+            suspended=Count('id', filter=Q(cancelled=None) & ~Q(suspended=None)),
+            cancelled=Count('id', filter=(~Q(cancelled=None)))
+        )
+    )
+
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    materialise_month_summaries(month_start)
+
     month_summary = []
-    for e, h in zip(event_sum.all(), helper_sum.all()):
-        assert(e['month']==h['month'])
-        incomplete = e['month'].date() >= now.date().replace(day=1)
-        month_summary.append({**e, **h, 'incomplete': incomplete})
+    for month in MonthSummary.objects.filter(month__lt=month_start).values('month', *MONTH_FIELDS):
+        month_summary.append({**month, 'incomplete': False})
+    for month in build_month_summary(month_start, now):
+        month_summary.append({**month, 'incomplete': True})
+
+    totals = {field: sum(month[field] or 0 for month in month_summary) for field in SUMMABLE_FIELDS}
+    # Like Sum(), None rather than 0 if there was nothing to add up
+    if all(month['helpers_wanted'] is None for month in month_summary):
+        totals['helpers_wanted'] = None
+
+    distinct = cached(versioned_key('stats', 'distinct', month_start.strftime('%Y-%m'), depends=(EVENT, VOLUNTEER)),
+                      lambda: build_distinct_totals(now), STATS_TIMEOUT)
+
+    event_totals = {
+        'events': totals['events'],
+        'cancelled_events': totals['cancelled_events'],
+        'owners': distinct['owners'],
+        'locations': distinct['locations'],
+        'helpers_wanted': totals['helpers_wanted'],
+    }
+
+    helper_totals = {
+        'helpers_provided': totals['helpers_provided'],
+        'distinct_helpers': distinct['distinct_helpers'],
+        'helpers_cancelled': totals['helpers_cancelled'],
+        'helpers_withdrawn': totals['helpers_withdrawn'],
+        'helpers_declined': totals['helpers_declined'],
+    }
 
     return ({
         'people_totals': people_totals,
@@ -217,26 +506,210 @@ def build_stats_screen(now):
         'month_summary': month_summary,
         })
 
-def response_as_csv(request, qs, fields, filename):
+# Number of rows fetched from the database at a time when streaming csv
+CSV_CHUNK_SIZE = 2000
+
+
+class Echo:
+
+    """
+    File-like object for csv.writer that just returns what is written,
+    so rows can be streamed rather than accumulated
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_rows(qs, columns):
+
+    """
+    Return an iterator over the values of `columns` (field names or
+    expressions) in `qs`, fetched in chunks rather than all at once
+    """
+
+    return qs.values_list(*columns).iterator(chunk_size=CSV_CHUNK_SIZE)
+
+
+def response_as_csv(request, rows, fields, filename):
 
     """
-    Return a response object containing the fields from `fields` inn `qs`
-    in csv
+    Return a streaming response containing `fields` as a header
+    followed by the tuples in `rows` in csv
     """
 
-    response = HttpResponse(
+    writer = csv.writer(Echo())
+
+    return StreamingHttpResponse(
+        (writer.writerow(row) for row in chain([fields], rows)),
         content_type="text/csv",
         headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
     )
 
-    writer = csv.writer(response)
-    writer.writerow(fields)
-    for record in qs:
-        row = []
-        for field in fields:
-            row.append(getattr(record,field, ''))
-        writer.writerow(row)
 
+# Calendar feeds also change as events start, so don't keep them too long
+CALENDAR_TIMEOUT = 15 * 60
+
+
+def cached_calendar(name, user, build):
+
+    """
+    Return the calendar feed `name` for user, calling build() to
+    serialise it only if there isn't a copy cached since the last change
+    to any event, volunteer or user
+    """
+
+    def build_feed():
+        body = build()
+        return { 'body': body,
+                 'etag': '"' + hashlib.md5(body.encode()).hexdigest() + '"',
+                 'last_modified': int(time.time()) }
+
+    return cached(versioned_key('calendar', name, user.uuid), build_feed, CALENDAR_TIMEOUT)
+
+
+def calendar_response(request, feed, filename):
+
+    """
+    Return a response containing the cached calendar feed, or a 304 if
+    the client already has it
+    """
+
+    response = get_conditional_response(request, etag=feed['etag'], last_modified=feed['last_modified'])
+    if response is None:
+        response = HttpResponse(
+            feed['body'],
+            content_type='text/calendar',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+        )
+    response.headers['ETag'] = feed['etag']
+    response.headers['Last-Modified'] = http_date(feed['last_modified'])
     return response
 
 
+# Keyset pagination
+
+KEYSET_PAGE_SIZE = 20
+
+# Totals are also keyed on the event, volunteer and user generations
+KEYSET_COUNT_TIMEOUT = 5 * 60
+
+
+class KeysetPage:
+
+    """
+    One page of results found by seeking past the sort keys of the
+    last row of the previous page (or before the first row of the
+    next one) rather than by OFFSET, so deep pages cost no more than
+    the first
+    """
+
+    def __init__(self, object_list, keys, has_next, has_previous, count):
+        self.object_list = object_list
+        self.keys = keys
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        return keyset_cursor(self.object_list[-1], self.keys) if self.object_list else ''
+
+    @property
+    def previous_cursor(self):
+        return keyset_cursor(self.object_list[0], self.keys) if self.object_list else ''
+
+
+def keyset_cursor(obj, keys):
+
+    """
+    Encode the values of keys from obj for use in a URL
+    """
+
+    values = [str(getattr(obj, key)) for key in keys]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def parse_keyset_cursor(cursor, queryset, keys):
+
+    """
+    Decode a cursor made by keyset_cursor, converting the values back
+    to the types of the model's fields. Return None if it's not valid
+    """
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        result = []
+        for key, value in zip(keys, values):
+            try:
+                field = queryset.model._meta.get_field(key)
+            except FieldDoesNotExist:
+                result.append(value)
+            else:
+                result.append(field.to_python(value))
+        return result
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def keyset_filter(keys, values, op):
+
+    """
+    Return a Q object equivalent to (keys) op (values) for a tuple
+    comparison with op 'gt' or 'lt'
+    """
+
+    q = Q()
+    for i, key in enumerate(keys):
+        term = Q(**{f'{key}__{op}': values[i]})
+        for j in range(i):
+            term &= Q(**{keys[j]: values[j]})
+        q |= term
+    return q
+
+
+def cached_count(queryset, count_key):
+
+    """
+    Return queryset.count(), cached under count_key until something
+    changes. count_key names the listing and the options that select
+    its rows, rather than being taken from the SQL which can include
+    the time of the request
+    """
+
+    return cached(versioned_key('count', *count_key), queryset.count, KEYSET_COUNT_TIMEOUT)
+
+
+def keyset_page(queryset, keys, params, count_key, per_page=KEYSET_PAGE_SIZE):
+
+    """
+    Return a KeysetPage of queryset ordered by keys (which must
+    identify a row uniquely), following the 'after' or 'before' cursor
+    in params if there is one. count_key identifies the rows for
+    caching the total, see cached_count()
+    """
+
+    after = parse_keyset_cursor(params.get('after', ''), queryset, keys)
+    before = parse_keyset_cursor(params.get('before', ''), queryset, keys) if after is None else None
+
+    count = cached_count(queryset, count_key)
+
+    if before is not None:
+        rows = list(queryset
+            .filter(keyset_filter(keys, before, 'lt'))
+            .order_by(*[f'-{key}' for key in keys])[:per_page + 1])
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], keys, True, has_previous, count)
+
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(keys, after, 'gt'))
+    rows = list(queryset.order_by(*keys)[:per_page + 1])
+    return KeysetPage(rows[:per_page], keys, len(rows) > per_page, after is not None, count)
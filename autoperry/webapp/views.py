@@ -9,9 +9,9 @@ from django.core.exceptions import PermissionDenied
 from django.core.mail import EmailMessage
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Count, F, Q, Window, When, Case, DecimalField
-from django.db.models.functions import Rank, Lower
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.db.models import CharField, Count, F, Q, Value
+from django.db.models.functions import Cast, Concat, Lower, Trim
+from django.http import HttpResponse, HttpResponseRedirect, Http404, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -26,9 +26,13 @@ from uuid import uuid4
 import ics
 import zoneinfo
 
+from .caching import bump_generation, load_event_versions, EVENT
 from .models import Event, Volunteer
-from .forms import EventForm, CustomUserCreationForm, UserEditForm, EmailForm
-from .util import send_template_email, autoperry_login_required, EmailVerificationTokenGenerator, event_clash_error, volunteer_clash_error, build_stats_screen, response_as_csv
+from .forms import EventForm, EventCreateForm, CustomUserCreationForm, UserEditForm, EmailForm
+from .locations import location_matches, invalidate_locations
+from .my_events import my_events
+from .ranking import helper_ranking, helper_rank, helper_rank_by_id
+from .util import add_helper, send_template_email, queue_template_email, queue_template_emails, autoperry_login_required, EmailVerificationTokenGenerator, event_clash_error, series_clashes, series_clash_error, volunteer_clash_error, current_event_ids, build_stats_screen, csv_rows, response_as_csv, keyset_page, cached_calendar, calendar_response
 
 import logging
 logger = logging.getLogger(__name__)
@@ -76,17 +80,17 @@ def index(request):
         if days not in [14, 28, 56]:
             days=14
 
-        event_list = (Event.objects.all()
+        event_list = load_event_versions(Event.objects.all()
                       .filter(start__gte=timezone.now())
                       .filter(start__lte=timezone.now()+timedelta(days=days))
                       .filter(cancelled=None)
-                      .annotate(helpers_available=Count('volunteer', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))))
-                      .filter(helpers_required__gt=F("helpers_available"))
+                      .filter(helpers_required__gt=F("current_helper_count"))
                       .order_by('start', 'location'))
 
     # Always
     return render(request, "webapp/index.html",
         context={'events': event_list,
+                 'helping': current_event_ids(user),
                  'days': days,
                  'login_form': login_form,
                  'errors': errors,
@@ -117,7 +121,7 @@ def events(request):
         flags = {'past': False, 'cancelled': True, 'mine': False, 'location': False}
     request.session['search_flags'] = flags
 
-    event_list = Event.objects.all().annotate(helpers_available=Count('volunteer', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))))
+    event_list = Event.objects.all()
 
     if not flags['past']:
         event_list = event_list.filter(start__gte=timezone.now())
@@ -130,24 +134,46 @@ def events(request):
     else:
         event_list = event_list.order_by('start', 'location')
 
-    events_as_organiser = event_list.filter(owner=user) if flags['mine'] else None
-    events_as_voluteer = (event_list.filter(volunteer__person=user, volunteer__withdrawn=None, volunteer__declined=None)) if flags['mine'] else None
+    if flags['mine']:
+        events_as_organiser = load_event_versions(event_list.filter(owner=user))
+        if flags['past']:
+            events_as_voluteer = event_list.filter(volunteer__person=user, volunteer__withdrawn=None, volunteer__declined=None)
+        else:
+            # Only future events are cached
+            events_as_voluteer = event_list.filter(pk__in=my_events(user)['helping'])
+        events_as_voluteer = load_event_versions(events_as_voluteer)
+    else:
+        events_as_organiser = events_as_voluteer = None
 
-    paginator = Paginator(event_list, 20, orphans=2)
-    paginator.ELLIPSIS = "X"
-    try:
-        page_number = int(request.GET.get('page'))
-    except (ValueError, TypeError) as e:
-        page_number = 1
-    if page_number < 1 or page_number > paginator.num_pages:
-        page_number = 1
+    if settings.WEBAPP_KEYSET_PAGINATION:
+        # The ordering doesn't change the total
+        count_key = ('events', flags['past'], flags['cancelled'])
+        if flags['location']:
+            page_obj = keyset_page(event_list.annotate(location_key=Lower('location')), ('location_key', 'start', 'id'), request.GET, count_key)
+        else:
+            page_obj = keyset_page(event_list, ('start', 'location', 'id'), request.GET, count_key)
+        page_range = None
+    else:
+        paginator = Paginator(event_list, 20, orphans=2)
+        paginator.ELLIPSIS = "X"
+        try:
+            page_number = int(request.GET.get('page'))
+        except (ValueError, TypeError) as e:
+            page_number = 1
+        if page_number < 1 or page_number > paginator.num_pages:
+            page_number = 1
+
+        page_obj = paginator.get_page(page_number)
+        page_range = paginator.get_elided_page_range(page_number, on_each_side=3, on_ends=1)
 
-    page_obj = paginator.get_page(page_number)
-    page_range = paginator.get_elided_page_range(page_number, on_each_side=3, on_ends=1)
+    # Fetch the versions keying the cached rows in one go
+    page_obj.object_list = load_event_versions(page_obj.object_list)
 
     return render(request, "webapp/events.html",
         context={'events': page_obj,
                  'page_range': page_range,
+                 'keyset': settings.WEBAPP_KEYSET_PAGINATION,
+                 'helping': current_event_ids(user),
                  'events_as_organiser': events_as_organiser,
                  'events_as_voluteer': events_as_voluteer,
                  'flags': flags})
@@ -161,14 +187,19 @@ def events_csv(request):
     Return all event records in CSV
     """
 
-    events = (Event.objects.all()
-        .annotate(helpers_provided=Count('volunteer', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))))
-    )
+    events = Event.objects.all().order_by('start', 'pk')
 
     fields = ("id", "start", "end", "location", "owner", "helpers_required", "helpers_provided",
         "created", "cancelled", "contact_address", "owner_reminded", "alerts", "notes")
 
-    return response_as_csv(request, events, fields, 'autoperry-events')
+    # Same as str(event.owner), but without fetching each owner
+    owner = Concat(Trim(Concat('owner__first_name', Value(' '), 'owner__last_name')),
+                   Value(' [#'), Cast('owner', CharField()), Value(']'))
+
+    columns = ("id", "start", "end", "location", owner, "helpers_required", "current_helper_count",
+        "created", "cancelled", "contact_address", "owner_reminded", "alerts", "notes")
+
+    return response_as_csv(request, csv_rows(events, columns), fields, 'autoperry-events')
 
 
 @autoperry_login_required()
@@ -178,7 +209,7 @@ def event_details(request, event_id):
     Individual event details
     """
 
-    event = get_object_or_404(Event, pk=event_id)
+    event = get_object_or_404(Event.objects.with_helpers(), pk=event_id)
 
     user = request.user
 
@@ -200,7 +231,7 @@ def event_create(request):
 
     if request.method == 'POST':
 
-        form = EventForm(request.POST)
+        form = EventCreateForm(request.POST)
 
         if form.is_valid():
 
@@ -211,6 +242,9 @@ def event_create(request):
             start = datetime.combine(date, start_time)
             end = datetime.combine(date, end_time)
 
+            if (form.cleaned_data['weeks'] or 1) > 1:
+                return event_create_series(request, form, start, end)
+
             message = event_clash_error(start, end, form.cleaned_data.get("location"))
             if message:
                 form.add_error(None, message)
@@ -229,12 +263,55 @@ def event_create(request):
                 return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
 
     else:
-        form = EventForm()
+        form = EventCreateForm()
+
+    return render(request, 'webapp/event-create.html', {'form': form })
+
+
+def event_create_series(request, form, start, end):
+
+    """
+    Create a weekly series of events from a valid EventCreateForm,
+    checking all of them for clashes at once and creating those that
+    don't clash
+    """
+
+    user = request.user
+    location = form.cleaned_data['location']
+
+    occurrences = [(start + timedelta(weeks=week), end + timedelta(weeks=week))
+                   for week in range(form.cleaned_data['weeks'])]
 
-    # Get a list of Locations
-    locations = Event.objects.filter(cancelled=None).values_list('location', flat=True).order_by('location').distinct()
+    clashes = series_clashes(occurrences, location)
+    message = series_clash_error(clashes, location) if clashes else None
 
-    return render(request, 'webapp/event-create.html', {'form': form, 'locations': locations })
+    clashing = set(start for start, end, events in clashes)
+    new_events = [Event(start=start,
+                        end=end,
+                        location=location,
+                        helpers_required=form.cleaned_data['helpers_required'],
+                        owner=user,
+                        contact_address=form.cleaned_data['contact_address'],
+                        notes=form.cleaned_data['notes'],
+                        alerts=form.cleaned_data['alerts'])
+                  for start, end in occurrences if start not in clashing]
+
+    if not new_events:
+        form.add_error(None, message)
+        return render(request, 'webapp/event-create.html', {'form': form })
+
+    with transaction.atomic():
+        Event.objects.bulk_create(new_events)
+        # bulk_create doesn't send post_save, so do what the signals would
+        bump_generation(EVENT)
+        invalidate_locations()
+
+    logger.info(f'"{user}" created {len(new_events)} weekly events at "{location}" from {new_events[0].start}')
+    messages.success(request, f'{len(new_events)} events successfully created')
+    if message:
+        messages.warning(request, message)
+
+    return HttpResponseRedirect(reverse('events') + '?f=1&mine=yes')
 
 
 @autoperry_login_required()
@@ -247,7 +324,7 @@ def event_clone(request, event_id):
     event = get_object_or_404(Event, pk=event_id)
 
     # Populate a new form from the event
-    form =EventForm(initial=
+    form =EventCreateForm(initial=
         { 'date': event.start.date(),
           'start_time': event.start.time().strftime('%H:%M'),
           'end_time': event.end.time().strftime('%H:%M'),
@@ -257,14 +334,7 @@ def event_clone(request, event_id):
           'notes': event.notes,
           'alerts': event.alerts})
 
-    # Get a list of Locations
-    locations = (Event.objects
-        .filter(cancelled=None)
-        .values_list('location', flat=True)
-        .order_by('location')
-        .distinct())
-
-    return render(request, 'webapp/event-create.html', {'form': form, 'locations': locations })
+    return render(request, 'webapp/event-create.html', {'form': form })
 
 
 @autoperry_login_required()
@@ -276,7 +346,7 @@ def event_edit(request, event_id):
 
     with transaction.atomic():
 
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.with_helpers(), pk=event_id)
 
         initial_data = { 'date': event.start.date(),
               'start_time': event.start.time(),
@@ -345,13 +415,15 @@ def event_edit(request, event_id):
                                 send_email = True
 
                         if send_email:
+                            emails = []
                             for helper in event.current_helpers:
                                 if helper.send_notifications:
-                                    send_template_email(helper, "event-edit",
+                                    emails.append((helper, "event-edit",
                                         { "event": event, "before": initial_data,
-                                          "after": form.cleaned_data })
+                                          "after": form.cleaned_data }))
                                 else:
                                     logger.warn(f'Can\'t notify "{helper}" that "{event}" has been edited')
+                            queue_template_emails(emails)
                         else:
                             logger.info(f'No emailable changes to "{event}"')
 
@@ -369,17 +441,9 @@ def event_edit(request, event_id):
 
             form =EventForm(initial_data)
 
-    # Get a list of Locations
-    locations = (Event.objects
-        .filter(cancelled=None)
-        .values_list('location', flat=True)
-        .order_by('location')
-        .distinct())
-
     # ... and display it
     return render(request, 'webapp/event-edit.html',
         {'form': form,
-          'locations': locations,
           'event': event })
 
 
@@ -392,7 +456,7 @@ def event_cancel(request, event_id):
 
     with transaction.atomic():
 
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.with_helpers(), pk=event_id)
         errors = 0
 
         user = request.user
@@ -417,11 +481,13 @@ def event_cancel(request, event_id):
 
                 logger.info(f'"{user}" cancelled "{event}"')
 
+                emails = []
                 for helper in event.current_helpers:
                     if helper.send_notifications:
-                        send_template_email(helper, "event-cancel", { "event": event })
+                        emails.append((helper, "event-cancel", { "event": event }))
                     else:
                         logger.info(f'Can\'t notify "{helper}" that "{event}" has been cancelled')
+                queue_template_emails(emails)
 
                 messages.success(request, 'Event cancelled')
 
@@ -430,6 +496,17 @@ def event_cancel(request, event_id):
     return render(request, 'webapp/event-cancel.html', {'event': event})
 
 
+@autoperry_login_required()
+def api_locations(request):
+
+    """
+    Return locations starting with the 'q' parameter, as a JSON list,
+    for location autocompletion
+    """
+
+    return JsonResponse(location_matches(request.GET.get('q', '')), safe=False)
+
+
 # ----------------------------------------------------------------------------------------
 # Helper Management
 # ----------------------------------------------------------------------------------------
@@ -441,59 +518,63 @@ def volunteer(request, event_id):
     Add current user as helper
     """
 
-    with transaction.atomic():
+    user = request.user
 
-        user = request.user
+    event = get_object_or_404(Event.objects.with_helpers(), pk=event_id)
+    errors = 0
 
-        event = get_object_or_404(Event, pk=event_id)
-        errors = 0
+    if event.past:
+        messages.error(request, "This event has already happened so you can't volunteer to help with it")
+        errors += 1
+    elif event.cancelled:
+        messages.error(request, "The request for help at this event has been cancelled so you can't volunteer to help with it")
+        errors += 1
+    elif event.has_current_helper(user):
+        messages.error(request, 'You have already volunteered to help at this event ')
+        errors += 1
+    elif not event.helpers_needed:
+        messages.error(request, "This event already has enough helpers so you can't also volunteer to help with it")
+        errors += 1
 
-        if event.past:
-            messages.error(request, "This event has already happened so you can't volunteer to help with it")
-            errors += 1
-        elif event.cancelled:
-            messages.error(request, "The request for help at this event has been cancelled so you can't volunteer to help with it")
-            errors += 1
-        elif event.has_current_helper(user):
-            messages.error(request, 'You have already volunteered to help at this event ')
-            errors += 1
-        elif not event.helpers_needed:
-            messages.error(request, "This event already has enough helpers so you can't also volunteer to help with it")
-            errors += 1
+    # Check for clashing events - test is (StartA <= EndB) and (EndA >= StartB)
+    message =volunteer_clash_error(user, event)
+    if message:
+        messages.error(request, message)
+        errors += 1
 
-        # Check for clashing events - test is (StartA <= EndB) and (EndA >= StartB)
-        message =volunteer_clash_error(user, event)
-        if message:
-            messages.error(request, message)
-            errors += 1
+    if errors:
+        return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
 
-        if errors:
-            return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
+    if request.method == 'POST':
+        if 'confirm' in request.POST:
 
-        if request.method == 'POST':
-            if 'confirm' in request.POST:
-                event.volunteer_set.create(person=user)
-
-                logger.info(f'"{user}" volunteered for "{event}"')
-                messages.success(request, 'You have been added as a helper for this event')
-
-                # Number of successful volunteering sessions for user
-                volountered = Volunteer.objects.filter(
-                    person=user,
-                    withdrawn=None,
-                    declined=None).count()
-                # Celebrate first, 5th and every subsequent 10
-                if (user.volunteer_celebration < volountered and
-                   (volountered == 1 or volountered % 5 == 0)):
-                    user.volunteer_celebration = volountered
-                    user.save()
-                    text = render_to_string(f"webapp/celebration-fragment.html", { 'number': volountered })
-                    messages.success(request, text)
+            # Someone else may have got there first, so check again
+            # while adding them
+            message = add_helper(event, user)
+            if message:
+                messages.error(request, message)
+                return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
 
-                if event.alerts and event.owner.send_notifications:
-                    send_template_email(event.owner, "volunteer", { "event": event, "helper": user })
+            logger.info(f'"{user}" volunteered for "{event}"')
+            messages.success(request, 'You have been added as a helper for this event')
+
+            # Number of successful volunteering sessions for user
+            volountered = Volunteer.objects.filter(
+                person=user,
+                withdrawn=None,
+                declined=None).count()
+            # Celebrate first, 5th and every subsequent 10
+            if (user.volunteer_celebration < volountered and
+               (volountered == 1 or volountered % 5 == 0)):
+                user.volunteer_celebration = volountered
+                user.save()
+                text = render_to_string(f"webapp/celebration-fragment.html", { 'number': volountered })
+                messages.success(request, text)
 
-            return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
+            if event.alerts and event.owner.send_notifications:
+                queue_template_email(event.owner, "volunteer", { "event": event, "helper": user })
+
+        return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
 
     return render(request, 'webapp/volunteer.html', {'event': event})
 
@@ -507,7 +588,7 @@ def unvolunteer(request, event_id):
 
     with transaction.atomic():
 
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.with_helpers(), pk=event_id)
         errors = 0
 
         user = request.user
@@ -524,7 +605,7 @@ def unvolunteer(request, event_id):
 
         if request.method == 'POST':
             if 'confirm' in request.POST:
-                volunteer = event.volunteer_set.get(person=user, withdrawn=None, declined=None)
+                volunteer = event.current_volunteer(user)
                 volunteer.withdrawn = timezone.now()
                 volunteer.save()
 
@@ -532,7 +613,7 @@ def unvolunteer(request, event_id):
                 messages.success(request, 'You are no longer a helper for this event')
 
                 if event.alerts and event.owner.send_notifications:
-                    send_template_email(event.owner, "unvolunteer", { "event": event, "helper": user })
+                    queue_template_email(event.owner, "unvolunteer", { "event": event, "helper": user })
 
             return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
 
@@ -544,7 +625,7 @@ def decline(request, event_id, helper_id):
 
     with transaction.atomic():
 
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.with_helpers(), pk=event_id)
         helper = get_object_or_404(get_user_model(), pk=helper_id)
         errors = 0
 
@@ -565,7 +646,7 @@ def decline(request, event_id, helper_id):
 
         if request.method == 'POST':
             if 'confirm' in request.POST:
-                volunteer = event.volunteer_set.get(person=helper, withdrawn=None, declined=None)
+                volunteer = event.current_volunteer(helper)
                 volunteer.declined = timezone.now()
                 volunteer.save()
 
@@ -573,7 +654,7 @@ def decline(request, event_id, helper_id):
                 messages.success(request, f'{helper.get_full_name()} as been removed as a helper')
 
                 if helper.send_notifications:
-                    send_template_email(helper, "helper-declined", { "event": event })
+                    queue_template_email(helper, "helper-declined", { "event": event })
 
             return HttpResponseRedirect(reverse('event-details', args=[event.pk]))
 
@@ -635,15 +716,6 @@ def account_list(request):
 
     base_users = get_user_model().objects.all()
 
-    # Find rank across all eligible users, before further filtering
-    ranked_users = (base_users
-        .annotate(num_helped=Count('volunteer__id', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None)), distinct=True))
-        .annotate(rank=Window(expression=Rank(), order_by=F('num_helped').desc()))
-        )
-    ranking = {}
-    for user in ranked_users:
-        ranking[user.pk] = user.rank
-
     users = get_user_model().objects.none()
 
     if flags['pending']:
@@ -663,37 +735,37 @@ def account_list(request):
     if flags['cancelled']:
         users = users | base_users.exclude(cancelled=None)
 
-    # Add helping & organising stats
-    whens = [
-        When(pk=k, then=v) for k, v in ranking.items()
-    ]
-    users = (users
-        .annotate(num_owned=Count('events_owned', distinct=True))
-        .annotate(num_helped=Count('volunteer__id', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None)), distinct=True))
-        .annotate(rank=Case(
-            *whens,
-            output_field=DecimalField()
-            )
-         )
-    )
+    # Add organising stats
+    users = users.annotate(num_owned=Count('events_owned', distinct=True))
 
     users = users.order_by('last_name', 'first_name')
 
-    paginator = Paginator(users, 20, orphans=2)
-    paginator.ELLIPSIS = "X"
-    try:
-        page_number = int(request.GET.get('page'))
-    except (ValueError, TypeError) as e:
-        page_number = 1
-    if page_number < 1 or page_number > paginator.num_pages:
-        page_number = 1
+    if settings.WEBAPP_KEYSET_PAGINATION:
+        count_key = ('account-list', *[flags[flag] for flag in ('pending', 'current', 'suspended', 'cancelled')])
+        page_obj = keyset_page(users, ('last_name', 'first_name', 'id'), request.GET, count_key)
+        page_range = None
+    else:
+        paginator = Paginator(users, 20, orphans=2)
+        paginator.ELLIPSIS = "X"
+        try:
+            page_number = int(request.GET.get('page'))
+        except (ValueError, TypeError) as e:
+            page_number = 1
+        if page_number < 1 or page_number > paginator.num_pages:
+            page_number = 1
+
+        page_obj = paginator.get_page(page_number)
+        page_range = paginator.get_elided_page_range(page_number, on_each_side=3, on_ends=1)
 
-    page_obj = paginator.get_page(page_number)
-    page_range = paginator.get_elided_page_range(page_number, on_each_side=3, on_ends=1)
+    # Add helping stats, ranked across all users, for just this page
+    ranking = helper_ranking()
+    for u in page_obj:
+        u.num_helped, u.rank = helper_rank(u, ranking)
 
     return render(request, "webapp/account-list.html",
         context={'users': page_obj,
                  'page_range': page_range,
+                 'keyset': settings.WEBAPP_KEYSET_PAGINATION,
                  'flags': flags})
 
 
@@ -707,8 +779,6 @@ def account_list_csv(request):
 
     users = (get_user_model().objects.all()
         .annotate(owned=Count('events_owned', distinct=True))
-        .annotate(helped=Count('volunteer__id', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None)), distinct=True))
-        .annotate(helper_rank=Window(expression=Rank(), order_by=F('helped').desc()))
         .order_by('last_name', 'first_name')
 
          )
@@ -719,7 +789,15 @@ def account_list_csv(request):
               "owned", "helped", "helper_rank",
               "is_superuser", "is_staff", "is_active")
 
-    return response_as_csv(request, users, fields, 'autoperry-users')
+    # 'helped' and 'helper_rank' come from the helper ranking, not the database
+    split = fields.index("helped")
+    columns = fields[:split] + fields[split+2:]
+    ranking = helper_ranking()
+
+    rows = (row[:split] + helper_rank_by_id(row[0], ranking) + row[split:]
+            for row in csv_rows(users, columns))
+
+    return response_as_csv(request, rows, fields, 'autoperry-users')
 
 
 
@@ -736,18 +814,7 @@ def account(request):
         user.save()
 
     # Get volunteering count and ranking for this user
-    all_users = (get_user_model().objects.all()
-        .annotate(num_helped=Count('volunteer__id', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None)), distinct=True))
-        .annotate(rank=Window(expression=Rank(), order_by=F('num_helped').desc())))
-
-    # Have to iterate the query set, rather than filter it, because it has to
-    # execute on the database with all users present
-    num_helped = rank = None
-    for u in all_users:
-        if u.pk == user.pk:
-            num_helped = u.num_helped
-            rank = u.rank
-            break
+    num_helped, rank = helper_rank(user)
 
     return render(request, "webapp/account.html",
         { 'num_helped': num_helped,
@@ -1153,51 +1220,50 @@ def ical(request, uuid):
 
     user = get_object_or_404(get_user_model(), uuid=uuid)
 
-    event_list = Event.objects.all().filter(start__gte=timezone.now()).filter(cancelled=None)
+    def build():
 
-    events_as_organiser = event_list.filter(owner=user)
-    events_as_voluteer = (event_list.filter(volunteer__person=user, volunteer__withdrawn=None, volunteer__declined=None))
+        event_list = Event.objects.all().filter(start__gte=timezone.now()).filter(cancelled=None)
 
-    c = ics.Calendar()
-    c.creator = f'AutoPerry - {settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}/'
-    tz = zoneinfo.ZoneInfo('Europe/London')
+        events_as_organiser = event_list.filter(owner=user)
+        events_as_voluteer = (event_list.filter(volunteer__person=user, volunteer__withdrawn=None, volunteer__declined=None))
 
-    for event in events_as_voluteer:
+        c = ics.Calendar()
+        c.creator = f'AutoPerry - {settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}/'
+        tz = zoneinfo.ZoneInfo('Europe/London')
 
-        description = render_to_string(f"webapp/ical-volunteer-fragment.txt", { 'event': event }).strip()
+        for event in events_as_voluteer:
 
-        e = ics.Event(
-          name = "AutoPerry helping",
-          description = description,
-          begin = event.start.replace(tzinfo=tz),
-          end = event.end.replace(tzinfo=tz),
-          location = event.location,
-          url = f"{settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}{event.get_absolute_url()}",
-          uid = f"helper-{event.pk}@autoperry.cambridgeringing.org"
-        )
-        c.events.add(e)
+            description = render_to_string(f"webapp/ical-volunteer-fragment.txt", { 'event': event }).strip()
 
-    for event in events_as_organiser:
+            e = ics.Event(
+              name = "AutoPerry helping",
+              description = description,
+              begin = event.start.replace(tzinfo=tz),
+              end = event.end.replace(tzinfo=tz),
+              location = event.location,
+              url = f"{settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}{event.get_absolute_url()}",
+              uid = f"helper-{event.pk}@autoperry.cambridgeringing.org"
+            )
+            c.events.add(e)
 
-        description = render_to_string(f"webapp/ical-owner-fragment.txt", { 'event': event }).strip()
+        for event in events_as_organiser:
 
-        e = ics.Event(
-          name = "AutoPerry organising",
-          description=description,
-          begin = event.start.replace(tzinfo=tz),
-          end = event.end.replace(tzinfo=tz),
-          location = event.location,
-          url = f"{settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}{event.get_absolute_url()}",
-          uid = f"organizer-{event.pk}@autoperry.cambridgeringing.org"
-        )
-        c.events.add(e)
+            description = render_to_string(f"webapp/ical-owner-fragment.txt", { 'event': event }).strip()
 
-    response = HttpResponse(
-        content_type='text/calendar',
-        headers={'Content-Disposition': 'attachment; filename="autoperry.ics"'},
-    )
+            e = ics.Event(
+              name = "AutoPerry organising",
+              description=description,
+              begin = event.start.replace(tzinfo=tz),
+              end = event.end.replace(tzinfo=tz),
+              location = event.location,
+              url = f"{settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}{event.get_absolute_url()}",
+              uid = f"organizer-{event.pk}@autoperry.cambridgeringing.org"
+            )
+            c.events.add(e)
+
+        return ''.join(c.serialize_iter())
 
-    response.writelines(c.serialize_iter())
+    response = calendar_response(request, cached_calendar('ical', user, build), 'autoperry.ics')
 
     logger.info(f'"{user}" calendar feed collected')
 
@@ -1208,43 +1274,38 @@ def ical_future(request, uuid):
 
     user = get_object_or_404(get_user_model(), uuid=uuid)
 
-    event_list = (Event.objects.all()
-                    .filter(start__gte=timezone.now())
-                    .filter(cancelled=None)
-                    .annotate(helpers_available=Count('volunteer', filter=(Q(volunteer__withdrawn=None) & Q(volunteer__declined=None))))
-                    .filter(helpers_required__gt=F("helpers_available")))
-
-    c = ics.Calendar()
-    c.creator = f'AutoPerry - {settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}/'
-    tz = zoneinfo.ZoneInfo('Europe/London')
-
-    for event in event_list:
+    def build():
 
         # Don't list events the current user is already helping with!
-        if event.has_current_helper(user):
-            continue
-
-        description = render_to_string(f"webapp/ical-future-fragment.txt", { 'event': event }).strip()
-
-        e = ics.Event(
-          name = "AutoPerry helpers needed",
-          description = description,
-          begin = event.start.replace(tzinfo=tz),
-          end = event.end.replace(tzinfo=tz),
-          location = event.location,
-          url = f"{settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}{event.get_absolute_url()}",
-          uid = f"event-{event.pk}@autoperry.cambridgeringing.org"
-        )
-        c.events.add(e)
+        event_list = (Event.objects.all()
+                        .filter(start__gte=timezone.now())
+                        .filter(cancelled=None)
+                        .filter(helpers_required__gt=F("current_helper_count"))
+                        .exclude(pk__in=Volunteer.objects.current().filter(person=user).values('event')))
+
+        c = ics.Calendar()
+        c.creator = f'AutoPerry - {settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}/'
+        tz = zoneinfo.ZoneInfo('Europe/London')
+
+        for event in event_list:
+
+            description = render_to_string(f"webapp/ical-future-fragment.txt", { 'event': event }).strip()
+
+            e = ics.Event(
+              name = "AutoPerry helpers needed",
+              description = description,
+              begin = event.start.replace(tzinfo=tz),
+              end = event.end.replace(tzinfo=tz),
+              location = event.location,
+              url = f"{settings.WEBAPP_SCHEME}://{settings.WEBAPP_DOMAIN}{event.get_absolute_url()}",
+              uid = f"event-{event.pk}@autoperry.cambridgeringing.org"
+            )
+            c.events.add(e)
 
-    response = HttpResponse(
-        content_type='text/calendar',
-        headers={'Content-Disposition': 'attachment; filename="autoperry-future.ics"'},
-    )
+        return ''.join(c.serialize_iter())
 
-    response.writelines(c.serialize_iter())
+    response = calendar_response(request, cached_calendar('ical-future', user, build), 'autoperry-future.ics')
 
     logger.info(f'"{user}" future calendar feed collected')
 
     return response
-
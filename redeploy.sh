@@ -12,6 +12,7 @@ cd autoperry
 
 ./manage.py collectstatic --no-input
 ./manage.py migrate
+./manage.py createcachetable
 
 systemctl --user restart autoperry
 
@@ -0,0 +1,19 @@
+#!/bin/bash
+
+homedir="${HOME}/practice-night-support/"
+appdir='autoperry'
+log="${homedir}logs/process_outbox.log"
+
+cd ${homedir}
+
+source venv/bin/activate
+
+cd "${appdir}"
+export DJANGO_SETTINGS_MODULE=autoperry.production_settings
+
+echo "*** Running $(date)" >>"${log}"
+
+./manage.py process_outbox --really >>"${log}"
+
+
+